@@ -1,7 +1,18 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from jose import jwt
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from dotenv import load_dotenv
+from app.db import get_db
+from app.models.user import User
+from app.schemas.user import UserOut
 import os
 
 load_dotenv()
@@ -9,8 +20,16 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_LIMIT = int(
+    os.getenv("PASSWORD_HASH_QUEUE_LIMIT", str(PASSWORD_HASH_WORKERS * 4)))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bearer_scheme = HTTPBearer(auto_error=False)
 
 
 def verify_password(plain_password, hashed_password):
@@ -21,9 +40,150 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    def __init__(self, workers=PASSWORD_HASH_WORKERS,
+                 queue_limit=PASSWORD_HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash")
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    @property
+    def queue_depth(self):
+        return max(0, self.in_flight - self.workers)
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(status_code=503,
+                                detail="Server is busy, try again shortly",
+                                headers={"Retry-After": "1"})
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        future = self._executor.submit(func, *args)
+        # the slot is held until the thread is done, even if the caller
+        # goes away in the meantime
+        future.add_done_callback(lambda done: loop.call_soon_threadsafe(
+            self._release, done, started))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future, started):
+        self.in_flight -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.failed += 1
+            return
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_latency_ms": (self.total_seconds / self.completed * 1000
+                               if self.completed else 0.0),
+            "max_latency_ms": self.max_seconds * 1000,
+        }
+
+
+password_hasher = PasswordHasher()
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(
         minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+class ExpiringLRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._entries)}
+
+
+token_cache = ExpiringLRU(TOKEN_CACHE_SIZE)
+user_cache = ExpiringLRU(USER_CACHE_SIZE)
+
+
+def decode_access_token(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.set(token, claims, claims.get("exp", 0))
+    return claims
+
+
+def _credentials_error():
+    return HTTPException(status_code=401,
+                         detail="Could not validate credentials",
+                         headers={"WWW-Authenticate": "Bearer"})
+
+
+async def get_current_user(
+        credentials: HTTPAuthorizationCredentials | None = Depends(
+            bearer_scheme),
+        db: AsyncSession = Depends(get_db)) -> UserOut:
+    if credentials is None:
+        raise _credentials_error()
+    try:
+        payload = decode_access_token(credentials.credentials)
+    except JWTError:
+        raise _credentials_error()
+    username = payload.get("sub")
+    if not username:
+        raise _credentials_error()
+
+    user = user_cache.get(username)
+    if user is None:
+        result = await db.execute(select(User.id, User.username).where(
+            User.username == username))
+        row = result.first()
+        if row is None:
+            raise _credentials_error()
+        user = UserOut(id=row.id, username=row.username)
+        user_cache.set(username, user, time.time() + USER_CACHE_TTL)
+    return user
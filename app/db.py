@@ -1,8 +1,203 @@
+import logging
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from app.metrics import (
+    db_full_scans,
+    db_slow_statements,
+    db_statement_duration,
+    db_statement_errors,
+    statement_operation,
+)
 
-DATABASE_URL = "sqlite+aiosqlite:///./notes.db"
-engine = create_async_engine(DATABASE_URL, echo=True)
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name, default="false"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./notes.db")
+DB_ECHO = _env_flag("DB_ECHO")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+DB_STATEMENT_HEADERS = _env_flag("DB_STATEMENT_HEADERS")
+DB_PROFILE = _env_flag("DB_PROFILE")
+DB_PROFILE_SIZE = int(os.getenv("DB_PROFILE_SIZE", "100"))
+
+FULL_SCAN_TABLES = {"notes", "users"}
+FULL_SCAN = re.compile(r"SCAN (?:TABLE )?(\w+)")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", "268435456")),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+}
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_pragmas
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    @property
+    def total_ms(self):
+        return sum(record["duration_ms"] or 0 for record in self.statements)
+
+    def profile(self):
+        return {"statements": self.count,
+                "total_ms": round(self.total_ms, 3),
+                "queries": self.statements}
+
+
+_statement_counter: ContextVar[StatementCounter | None] = ContextVar(
+    "statement_counter", default=None)
+
+
+@contextmanager
+def count_statements():
+    counter = StatementCounter()
+    token = _statement_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _statement_counter.reset(token)
+
+
+def _record_statement(conn, cursor, statement, parameters, context,
+                      executemany):
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter.count += 1
+        record = {"statement": statement, "duration_ms": None}
+        counter.statements.append(record)
+        conn.info["statement_record"] = record
+    conn.info["statement_started"] = time.perf_counter()
+
+
+def _explain(conn, statement, parameters):
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.debug("EXPLAIN QUERY PLAN failed: %s", e)
+        return []
+    finally:
+        cursor.close()
+
+
+def full_scans(plan):
+    tables = []
+    for detail in plan:
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in FULL_SCAN_TABLES:
+            tables.append(match.group(1))
+    return tables
+
+
+def _time_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    started = conn.info.pop("statement_started", None)
+    record = conn.info.pop("statement_record", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    operation = statement_operation(statement)
+    db_statement_duration.observe(elapsed_ms / 1000, operation)
+    if record is not None:
+        record["duration_ms"] = round(elapsed_ms, 3)
+    if elapsed_ms < DB_SLOW_QUERY_MS:
+        return
+
+    db_slow_statements.inc(operation)
+    plan = []
+    if operation in ("SELECT", "WITH") and not executemany and \
+            conn.dialect.name == "sqlite":
+        plan = _explain(conn, statement, parameters)
+    scanned = full_scans(plan)
+    for table in scanned:
+        db_full_scans.inc(table)
+    if record is not None:
+        record.update(slow=True, plan=plan, full_scans=scanned)
+    logger.warning("Slow %s (%.1f ms)%s: %s%s", operation, elapsed_ms,
+                   f" full scan of {', '.join(scanned)}" if scanned else "",
+                   statement, "".join(f"\n  {detail}" for detail in plan))
+
+
+def _count_error(exception_context):
+    if exception_context.connection is not None:
+        exception_context.connection.info.pop("statement_started", None)
+        exception_context.connection.info.pop("statement_record", None)
+    db_statement_errors.inc(
+        statement_operation(exception_context.statement or ""))
+
+
+def instrument_engine(async_engine):
+    sync_engine = async_engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _record_statement)
+    event.listen(sync_engine, "after_cursor_execute", _time_statement)
+    event.listen(sync_engine, "handle_error", _count_error)
+
+
+def make_engine(url=DATABASE_URL, echo=DB_ECHO, pragmas=SQLITE_PRAGMAS,
+                pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT):
+    options = {"echo": echo}
+    database = make_url(url).database
+    if database and database != ":memory:":
+        options.update(pool_size=pool_size, max_overflow=max_overflow,
+                       pool_timeout=pool_timeout)
+    new_engine = create_async_engine(url, **options)
+    if new_engine.dialect.name == "sqlite" and pragmas:
+        event.listen(new_engine.sync_engine, "connect",
+                     _pragma_listener(pragmas))
+    instrument_engine(new_engine)
+    return new_engine
+
+
+class QueryProfiles:
+    def __init__(self, size=DB_PROFILE_SIZE):
+        self.size = size
+        self.profiles = OrderedDict()
+
+    def add(self, profile):
+        profile_id = uuid.uuid4().hex
+        self.profiles[profile_id] = profile
+        while len(self.profiles) > self.size:
+            self.profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id):
+        return self.profiles.get(profile_id)
+
+
+query_profiles = QueryProfiles()
+
+engine = make_engine()
 SessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
@@ -11,3 +206,8 @@ Base = declarative_base()
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def get_db():
+    async with SessionLocal() as session:
+        yield session
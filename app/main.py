@@ -1,15 +1,98 @@
-from fastapi import FastAPI
-from app.routers import users, notes
-from app.db import init_db
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from app.routers import debug, users, notes
+from app.auth import password_hasher, token_cache, user_cache
+from app.compression import CompressionMiddleware
+from app.db import (
+    DB_PROFILE, DB_STATEMENT_HEADERS, count_statements, init_db,
+    query_profiles)
+from app.metrics import MetricsMiddleware, registry
+from app.note_events import note_event_broker
+from app.translation import (
+    close_http_session,
+    start_http_session,
+    translation_batcher,
+)
+from app.translation_cache import translation_cache
+from app.note_translations import note_translation_workers
+from app.note_sync import tombstone_compactor
 from contextlib import asynccontextmanager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await start_http_session()
+    await note_translation_workers.start()
+    tombstone_compactor.start()
     yield
+    await tombstone_compactor.stop()
+    await note_translation_workers.stop()
+    await close_http_session()
 
 app = FastAPI(title="Simple Notes App", lifespan=lifespan)
 
 app.include_router(users.router)
 app.include_router(notes.router)
+if DB_PROFILE:
+    app.include_router(debug.router)
+
+
+async def count_db_statements(request: Request, call_next):
+    if not (DB_STATEMENT_HEADERS or DB_PROFILE):
+        return await call_next(request)
+    with count_statements() as counter:
+        response = await call_next(request)
+    response.headers["X-DB-Statements"] = str(counter.count)
+    response.headers["X-DB-Time"] = f"{counter.total_ms:.3f}"
+    if DB_PROFILE:
+        response.headers["X-DB-Profile"] = query_profiles.add({
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            **counter.profile()})
+    return response
+
+
+# BaseHTTPMiddleware costs every request, so only install it when asked
+if DB_STATEMENT_HEADERS or DB_PROFILE:
+    app.middleware("http")(count_db_statements)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(),
+                             media_type="text/plain; version=0.0.4")
+
+
+registry.add_stats("password_hash", "Password hashing pool",
+                   password_hasher.stats,
+                   counters=("completed", "failed", "rejected"))
+registry.add_stats("auth_token_cache", "Verified token cache",
+                   token_cache.stats, counters=("hits", "misses"))
+registry.add_stats("auth_user_cache", "User lookup cache", user_cache.stats,
+                   counters=("hits", "misses"))
+registry.add_stats("translation_cache", "Translation cache",
+                   translation_cache.stats,
+                   counters=("memory_hits", "persistent_hits", "misses"))
+registry.add_stats("translation_batcher", "Translation batching", lambda: {
+    "upstream_calls": translation_batcher.upstream_calls,
+    "requested_texts": translation_batcher.requested_texts,
+    "sent_texts": translation_batcher.sent_texts},
+    counters=("upstream_calls", "requested_texts", "sent_texts"))
+registry.add_stats("note_translation_workers", "Background note translation",
+                   lambda: {
+                       "processed": note_translation_workers.processed,
+                       "failed": note_translation_workers.failed,
+                       "dropped": note_translation_workers.dropped,
+                       "queued": (note_translation_workers.queue.qsize()
+                                  if note_translation_workers.queue else 0)},
+                   counters=("processed", "failed", "dropped"))
+registry.add_stats("note_events", "Note change feed",
+                   note_event_broker.stats,
+                   counters=("published", "dropped"))
+registry.add_stats("tombstones", "Tombstone compaction", lambda: {
+    "compacted": tombstone_compactor.compacted}, counters=("compacted",))
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,210 @@
+import bisect
+import time
+
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+              0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"") \
+        .replace("\n", r"\n")
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        for labels, value in self.values.items():
+            yield (f"{self.name}{_format_labels(self.labels, labels)} "
+                   f"{_format_value(value)}")
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1),
+                                            0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),),
+                                           counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield (f"{self.name}_bucket"
+                       f"{_format_labels(self.labels, labels, le)} "
+                       f"{cumulative}")
+            suffix = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{suffix} {_format_value(total)}"
+            yield f"{self.name}_count{suffix} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.stats_sources = []
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_stats(self, prefix, help_text, stats, counters=()):
+        self.stats_sources.append((prefix, help_text, stats,
+                                   frozenset(counters)))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        # snapshots of the counters the app already keeps for itself
+        for prefix, help_text, stats, counters in self.stats_sources:
+            for key, value in stats().items():
+                if isinstance(value, bool) or \
+                        not isinstance(value, (int, float)):
+                    continue
+                if key in counters:
+                    name, kind = f"{prefix}_{key}_total", "counter"
+                else:
+                    name, kind = f"{prefix}_{key}", "gauge"
+                lines.append(f"# HELP {name} {help_text}: {key}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status",
+    ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ("method", "route"))
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being served",
+    ("method", "route"))
+db_statement_duration = registry.histogram(
+    "db_statement_duration_seconds", "Database statement latency",
+    ("operation",), DB_BUCKETS)
+db_statement_errors = registry.counter(
+    "db_statement_errors_total", "Database statements that raised",
+    ("operation",))
+db_slow_statements = registry.counter(
+    "db_slow_statements_total", "Statements over DB_SLOW_QUERY_MS",
+    ("operation",))
+db_full_scans = registry.counter(
+    "db_full_scans_total", "Slow statements that scan a whole table",
+    ("table",))
+translation_upstream_duration = registry.histogram(
+    "translation_upstream_duration_seconds",
+    "Translation API call latency")
+translation_upstream_errors = registry.counter(
+    "translation_upstream_errors_total", "Failed translation API calls",
+    ("reason",))
+
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def statement_operation(statement: str) -> str:
+    operation = statement[:16].lstrip().split(None, 1)
+    operation = operation[0].upper() if operation else ""
+    return operation if operation in SQL_OPERATIONS else "OTHER"
+
+
+def _route_template(scope) -> str:
+    app = scope.get("app")
+    partial = None
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        labels = (scope["method"], _route_template(scope))
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(*labels)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(time.perf_counter() - started,
+                                          *labels)
+            http_requests_in_flight.dec(*labels)
+            http_requests.inc(*labels, status)
@@ -1,11 +1,144 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import (
+    Column, Float, Integer, String, ForeignKey, Index, event)
 from app.db import Base
 
 
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (
+        Index("ix_notes_owner_id_id", "owner_id", "id"),
+        Index("ix_notes_owner_id_change_seq", "owner_id", "change_seq"),
+        # a deleted id must never come back: tombstones refer to it
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     content = Column(String)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    change_seq = Column(Integer, nullable=False, default=0)
+
+
+class NoteVersion(Base):
+    __tablename__ = "note_versions"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    compacted_seq = Column(Integer, nullable=False, default=0)
+
+
+class NoteTombstone(Base):
+    __tablename__ = "note_tombstones"
+    __table_args__ = (
+        Index("ix_note_tombstones_owner_id_change_seq",
+              "owner_id", "change_seq"),
+    )
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    note_id = Column(Integer, primary_key=True)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(Float, nullable=False, index=True)
+
+
+# owner_id is indexed too, so a search matches the owner's notes only
+# instead of ranking every user's hits and filtering afterwards
+NOTES_FTS_DDL = (
+    "CREATE VIRTUAL TABLE notes_fts USING fts5("
+    "title, content, owner_id, content='notes', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts(rowid, title, content, owner_id) "
+    "VALUES (new.id, new.title, new.content, new.owner_id); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content, owner_id) "
+    "VALUES ('delete', old.id, old.title, old.content, old.owner_id); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_au "
+    "AFTER UPDATE OF title, content, owner_id ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content, owner_id) "
+    "VALUES ('delete', old.id, old.title, old.content, old.owner_id); "
+    "INSERT INTO notes_fts(rowid, title, content, owner_id) "
+    "VALUES (new.id, new.title, new.content, new.owner_id); END",
+)
+NOTES_FTS_TRIGGERS = ("notes_fts_ai", "notes_fts_ad", "notes_fts_au")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_notes_fts(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    columns = {row[1] for row in connection.exec_driver_sql(
+        "PRAGMA table_info(notes_fts)")}
+    if "owner_id" in columns:
+        return
+    if columns:
+        # built before owner_id was indexed
+        connection.exec_driver_sql("DROP TABLE notes_fts")
+        for trigger in NOTES_FTS_TRIGGERS:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    for statement in NOTES_FTS_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(
+        "INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+
+ADDED_COLUMNS = (
+    ("notes", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("note_versions", "compacted_seq", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def add_missing_columns(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    added = set()
+    for table, column, ddl in ADDED_COLUMNS:
+        existing = {row[1] for row in connection.exec_driver_sql(
+            f"PRAGMA table_info({table})")}
+        if column not in existing:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            added.add((table, column))
+    if ("notes", "change_seq") in added:
+        # ids are unique per owner, so they double as the initial sequence;
+        # the owner's version must start past them for later writes
+        connection.exec_driver_sql(
+            "UPDATE notes SET change_seq = id WHERE change_seq = 0")
+        connection.exec_driver_sql(
+            "INSERT INTO note_versions (owner_id, version, compacted_seq) "
+            "SELECT owner_id, MAX(change_seq), 0 FROM notes "
+            "WHERE owner_id IS NOT NULL GROUP BY owner_id "
+            "ON CONFLICT (owner_id) DO UPDATE SET "
+            "version = MAX(note_versions.version, excluded.version)")
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_notes_owner_id_id "
+        "ON notes (owner_id, id)")
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_notes_owner_id_change_seq "
+        "ON notes (owner_id, change_seq)")
+    rekey_tombstones(connection)
+
+
+def rekey_tombstones(connection):
+    # tombstones used to be keyed on note_id alone, so a reused id of
+    # another owner overwrote them
+    key = [row[1] for row in connection.exec_driver_sql(
+        "PRAGMA table_info(note_tombstones)") if row[5]]
+    if key != ["note_id"]:
+        return
+    connection.exec_driver_sql(
+        "ALTER TABLE note_tombstones RENAME TO note_tombstones_old")
+    for index in NoteTombstone.__table__.indexes:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    NoteTombstone.__table__.create(connection)
+    connection.exec_driver_sql(
+        "INSERT INTO note_tombstones (owner_id, note_id, change_seq, "
+        "deleted_at) SELECT owner_id, note_id, change_seq, deleted_at "
+        "FROM note_tombstones_old")
+    connection.exec_driver_sql("DROP TABLE note_tombstones_old")
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_notes_fts(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS notes_fts")
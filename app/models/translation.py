@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Float, ForeignKey, Integer, String
+from app.db import Base
+
+
+class TranslationCacheEntry(Base):
+    __tablename__ = "translation_cache"
+
+    key = Column(String, primary_key=True)
+    translated_text = Column(String)
+    created_at = Column(Float, index=True)
+
+
+class NoteTranslation(Base):
+    __tablename__ = "note_translations"
+
+    note_id = Column(Integer, ForeignKey("notes.id"), primary_key=True)
+    target_lang = Column(String, primary_key=True)
+    source_lang = Column(String)
+    content_hash = Column(String)
+    translated_text = Column(String, nullable=True)
+    status = Column(String, index=True)
+    updated_at = Column(Float)
@@ -0,0 +1,123 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import OrderedDict, defaultdict
+
+from pydantic_core import to_json
+
+NOTE_EVENTS_BUFFER_SIZE = int(os.getenv("NOTE_EVENTS_BUFFER_SIZE", "1000"))
+NOTE_EVENTS_QUEUE_SIZE = int(os.getenv("NOTE_EVENTS_QUEUE_SIZE", "256"))
+NOTE_EVENTS_HEARTBEAT = float(os.getenv("NOTE_EVENTS_HEARTBEAT", "15"))
+NOTE_EVENTS_RETAIN = float(os.getenv("NOTE_EVENTS_RETAIN", "300"))
+NOTE_EVENTS_MAX_OWNERS = int(os.getenv("NOTE_EVENTS_MAX_OWNERS", "10000"))
+
+
+def format_event(event_id: int, kind: str, data) -> bytes:
+    return (f"id: {event_id}\nevent: {kind}\ndata: ".encode()
+            + to_json(data) + b"\n\n")
+
+
+class Subscription:
+    def __init__(self, owner_id: int, queue_size: int):
+        self.owner_id = owner_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+
+class NoteEventBroker:
+    def __init__(self, buffer_size=NOTE_EVENTS_BUFFER_SIZE,
+                 queue_size=NOTE_EVENTS_QUEUE_SIZE,
+                 retain=NOTE_EVENTS_RETAIN, max_owners=NOTE_EVENTS_MAX_OWNERS):
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self.retain = retain
+        self.max_owners = max_owners
+        # replay buffers only for owners with a live or recently
+        # disconnected subscriber, least recently active first
+        self.buffers = OrderedDict()
+        self.disconnected = OrderedDict()
+        self.subscribers = defaultdict(set)
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, owner_id: int, events):
+        self._evict()
+        buffer = self.buffers.get(owner_id)
+        subscribers = self.subscribers.get(owner_id, ())
+        if buffer is None:
+            # nobody is watching or about to resume
+            self.published += len(events)
+            return
+        self.buffers.move_to_end(owner_id)
+        for event_id, kind, data in events:
+            frame = format_event(event_id, kind, data)
+            # writers commit concurrently, so keep the buffer ordered by id
+            bisect.insort(buffer, (event_id, frame))
+            for subscription in list(subscribers):
+                try:
+                    subscription.queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    self._drop(subscription)
+            self.published += 1
+        if len(buffer) > self.buffer_size:
+            del buffer[:len(buffer) - self.buffer_size]
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.disconnected:
+            owner_id, since = next(iter(self.disconnected.items()))
+            if now - since < self.retain:
+                break
+            del self.disconnected[owner_id]
+            self.buffers.pop(owner_id, None)
+        if len(self.buffers) <= self.max_owners:
+            return
+        for owner_id in list(self.buffers):
+            if len(self.buffers) <= self.max_owners:
+                break
+            if owner_id not in self.subscribers:
+                del self.buffers[owner_id]
+                self.disconnected.pop(owner_id, None)
+
+    def _drop(self, subscription: Subscription):
+        self.unsubscribe(subscription)
+        self.dropped += 1
+        queue = subscription.queue
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        subscription = Subscription(owner_id, self.queue_size)
+        self.subscribers[owner_id].add(subscription)
+        self.disconnected.pop(owner_id, None)
+        self.buffers.setdefault(owner_id, [])
+        self.buffers.move_to_end(owner_id)
+        self._evict()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.owner_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.owner_id]
+                self.disconnected[subscription.owner_id] = time.monotonic()
+
+    def replay(self, owner_id: int, last_event_id: int):
+        buffer = self.buffers.get(owner_id)
+        if not buffer or buffer[0][0] > last_event_id + 1:
+            return None
+        start = bisect.bisect_right(buffer, (last_event_id, b"\xff"))
+        return [frame for _, frame in buffer[start:]]
+
+    def stats(self):
+        return {
+            "subscribers": sum(len(s) for s in self.subscribers.values()),
+            "buffered_owners": len(self.buffers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+note_event_broker = NoteEventBroker()
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import time
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import SessionLocal
+from app.models.note import NoteTombstone, NoteVersion
+
+logger = logging.getLogger(__name__)
+
+NOTE_TOMBSTONE_TTL = float(os.getenv("NOTE_TOMBSTONE_TTL", "2592000"))
+NOTE_TOMBSTONE_COMPACT_INTERVAL = float(
+    os.getenv("NOTE_TOMBSTONE_COMPACT_INTERVAL", "3600"))
+
+
+async def record_tombstones(db: AsyncSession, owner_id: int, tombstones):
+    now = time.time()
+    rows = [{"note_id": note_id, "owner_id": owner_id, "change_seq": seq,
+             "deleted_at": now} for note_id, seq in tombstones]
+    if not rows:
+        return
+    stmt = insert(NoteTombstone)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NoteTombstone.owner_id, NoteTombstone.note_id],
+        set_={"change_seq": stmt.excluded.change_seq,
+              "deleted_at": stmt.excluded.deleted_at})
+    await db.execute(stmt, rows)
+
+
+async def compact_tombstones(db: AsyncSession,
+                             max_age: float = NOTE_TOMBSTONE_TTL) -> int:
+    cutoff = time.time() - max_age
+    result = await db.execute(
+        select(NoteTombstone.owner_id, func.max(NoteTombstone.change_seq))
+        .where(NoteTombstone.deleted_at < cutoff)
+        .group_by(NoteTombstone.owner_id))
+    horizons = result.all()
+    if not horizons:
+        return 0
+    # clients synced before the newest dropped tombstone must resync fully
+    stmt = insert(NoteVersion).values([
+        {"owner_id": owner_id, "version": seq, "compacted_seq": seq}
+        for owner_id, seq in horizons])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[NoteVersion.owner_id],
+        set_={"compacted_seq": func.max(NoteVersion.compacted_seq,
+                                        stmt.excluded.compacted_seq)}))
+    result = await db.execute(delete(NoteTombstone).where(
+        NoteTombstone.deleted_at < cutoff))
+    return result.rowcount
+
+
+class TombstoneCompactor:
+    def __init__(self, interval=NOTE_TOMBSTONE_COMPACT_INTERVAL,
+                 max_age=NOTE_TOMBSTONE_TTL, session_factory=SessionLocal):
+        self.interval = interval
+        self.max_age = max_age
+        self.session_factory = session_factory
+        self._task = None
+        self.compacted = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def run_once(self) -> int:
+        async with self.session_factory() as db:
+            compacted = await compact_tombstones(db, self.max_age)
+            await db.commit()
+        self.compacted += compacted
+        return compacted
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Compacting note tombstones failed")
+
+
+tombstone_compactor = TombstoneCompactor()
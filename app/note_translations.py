@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import SessionLocal
+from app.models.note import Note
+from app.models.translation import NoteTranslation
+from app.translation import translate_with_status
+
+logger = logging.getLogger(__name__)
+
+NOTE_TRANSLATION_SOURCE = os.getenv("NOTE_TRANSLATION_SOURCE", "ru")
+NOTE_TRANSLATION_TARGETS = [
+    lang.strip() for lang in
+    os.getenv("NOTE_TRANSLATION_TARGETS", "en").split(",") if lang.strip()]
+if not NOTE_TRANSLATION_TARGETS:
+    raise RuntimeError("NOTE_TRANSLATION_TARGETS must name at least one "
+                       "language")
+NOTE_TRANSLATION_WORKERS = int(os.getenv("NOTE_TRANSLATION_WORKERS", "4"))
+NOTE_TRANSLATION_QUEUE_SIZE = int(
+    os.getenv("NOTE_TRANSLATION_QUEUE_SIZE", "10000"))
+NOTE_TRANSLATION_RETRY_AFTER = float(
+    os.getenv("NOTE_TRANSLATION_RETRY_AFTER", "300"))
+NOTE_TRANSLATION_SWEEP_INTERVAL = float(
+    os.getenv("NOTE_TRANSLATION_SWEEP_INTERVAL", "60"))
+
+
+def content_hash(content: str | None) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def retry_due(translation, now=None) -> bool:
+    now = time.time() if now is None else now
+    return (translation.updated_at or 0) + NOTE_TRANSLATION_RETRY_AFTER \
+        <= now
+
+
+async def mark_stale(db: AsyncSession, notes, targets=None):
+    targets = NOTE_TRANSLATION_TARGETS if targets is None else targets
+    now = time.time()
+    rows = [{"note_id": note_id, "target_lang": lang,
+             "source_lang": NOTE_TRANSLATION_SOURCE,
+             "content_hash": content_hash(content), "status": "pending",
+             "updated_at": now}
+            for note_id, content in notes for lang in targets]
+    if not rows:
+        return
+    stmt = insert(NoteTranslation)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NoteTranslation.note_id, NoteTranslation.target_lang],
+        set_={"content_hash": stmt.excluded.content_hash,
+              "status": stmt.excluded.status,
+              "updated_at": stmt.excluded.updated_at},
+        where=(NoteTranslation.content_hash != stmt.excluded.content_hash)
+        | (NoteTranslation.status != "ready"))
+    await db.execute(stmt, rows)
+
+
+async def forget_translations(db: AsyncSession, note_ids):
+    await db.execute(delete(NoteTranslation).where(
+        NoteTranslation.note_id.in_(note_ids)))
+
+
+class NoteTranslationWorkers:
+    def __init__(self, workers=NOTE_TRANSLATION_WORKERS,
+                 queue_size=NOTE_TRANSLATION_QUEUE_SIZE,
+                 session_factory=SessionLocal,
+                 sweep_interval=NOTE_TRANSLATION_SWEEP_INTERVAL):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.session_factory = session_factory
+        self.sweep_interval = sweep_interval
+        self.queue = None
+        self._tasks = []
+        self._overflowed = False
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def enqueue(self, note_ids, targets=None):
+        if self.queue is None:
+            return
+        targets = NOTE_TRANSLATION_TARGETS if targets is None else targets
+        for note_id in note_ids:
+            for lang in targets:
+                try:
+                    self.queue.put_nowait((note_id, lang))
+                except asyncio.QueueFull:
+                    self.dropped += 1
+                    self._overflowed = True
+
+    async def requeue(self):
+        self._overflowed = False
+        room = self.queue.maxsize - self.queue.qsize()
+        if room <= 0:
+            self._overflowed = True
+            return
+        retry_before = time.time() - NOTE_TRANSLATION_RETRY_AFTER
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(NoteTranslation.note_id, NoteTranslation.target_lang)
+                .where((NoteTranslation.status == "pending")
+                       | ((NoteTranslation.status == "failed")
+                          & (NoteTranslation.updated_at <= retry_before)))
+                .limit(room))
+            for note_id, lang in result.all():
+                self.enqueue([note_id], [lang])
+
+    async def start(self):
+        if self.queue is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run())
+                       for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+        await self.requeue()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.queue = None
+
+    async def _sweep(self):
+        # picks up jobs dropped on a full queue and failed translations
+        # whose backoff has expired; an idle queue holds nothing to repeat
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            if not self._overflowed and not self.queue.empty():
+                continue
+            try:
+                await self.requeue()
+            except Exception:
+                logger.exception("Requeueing note translations failed")
+
+    async def _run(self):
+        while True:
+            note_id, lang = await self.queue.get()
+            try:
+                await self.process(note_id, lang)
+            except Exception:
+                self.failed += 1
+                logger.exception("Translating note %s to %s failed",
+                                 note_id, lang)
+            finally:
+                self.queue.task_done()
+
+    async def process(self, note_id: int, lang: str):
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Note.content, NoteTranslation.content_hash,
+                       NoteTranslation.status, NoteTranslation.source_lang)
+                .join(NoteTranslation, NoteTranslation.note_id == Note.id)
+                .where(Note.id == note_id,
+                       NoteTranslation.target_lang == lang))
+            row = result.first()
+        if row is None:
+            return
+        content, stored_hash, status, source_lang = row
+        expected_hash = content_hash(content)
+        if status == "ready" and stored_hash == expected_hash:
+            return
+
+        ok, translated = await translate_with_status(content or "",
+                                                     source_lang, lang)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(NoteTranslation)
+                .where(NoteTranslation.note_id == note_id,
+                       NoteTranslation.target_lang == lang,
+                       NoteTranslation.content_hash == expected_hash)
+                .values(status="ready" if ok else "failed",
+                        translated_text=translated if ok else None,
+                        updated_at=time.time()))
+            await db.commit()
+        if ok:
+            self.processed += 1
+        else:
+            self.failed += 1
+
+
+note_translation_workers = NoteTranslationWorkers()
@@ -0,0 +1,149 @@
+"""Bulk-create users from a CSV or NDJSON file.
+
+    python -m app.provision users.csv
+    python -m app.provision users.ndjson --batch-size 5000 --workers 8
+
+CSV files need a header with ``username`` and ``password`` columns; NDJSON
+files hold one ``{"username": ..., "password": ...}`` object per line.
+Usernames that already exist (or repeat within the file) are reported and
+skipped without aborting the run.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from app.auth import get_password_hash
+from app.db import SessionLocal, init_db
+from app.models.user import User
+
+DEFAULT_BATCH_SIZE = 2000
+
+
+class ProvisionReport:
+    def __init__(self):
+        self.created = 0
+        self.existing = []
+        self.repeated = []
+        self.invalid = []
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "existing": self.existing,
+            "repeated": self.repeated,
+            "invalid": self.invalid,
+        }
+
+
+def read_users(path, file_format=None):
+    file_format = file_format or (
+        "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row.get("username"), row.get("password")
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                if not isinstance(row, dict):
+                    yield line_no, None, None
+                    continue
+                yield line_no, row.get("username"), row.get("password")
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def provision(rows, session_factory=SessionLocal,
+                    batch_size=DEFAULT_BATCH_SIZE, workers=None,
+                    hash_func=get_password_hash):
+    report = ProvisionReport()
+    seen = set()
+    loop = asyncio.get_running_loop()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(rows, batch_size):
+            candidates = {}
+            for line_no, username, password in batch:
+                if not username or not password:
+                    report.invalid.append(line_no)
+                elif username in seen:
+                    report.repeated.append(username)
+                else:
+                    seen.add(username)
+                    candidates[username] = password
+
+            async with session_factory() as db:
+                result = await db.execute(select(User.username).where(
+                    User.username.in_(list(candidates))))
+                for username in result.scalars().all():
+                    report.existing.append(username)
+                    del candidates[username]
+            if not candidates:
+                continue
+
+            usernames = list(candidates)
+            chunksize = max(1, len(usernames) // (4 * (workers or 4)))
+            hashed = await loop.run_in_executor(None, lambda: list(
+                executor.map(hash_func, candidates.values(),
+                             chunksize=chunksize)))
+
+            stmt = insert(User).on_conflict_do_nothing(
+                index_elements=[User.username]).returning(User.username)
+            async with session_factory() as db:
+                result = await db.execute(stmt, [
+                    {"username": username, "hashed_password": password_hash}
+                    for username, password_hash in zip(usernames, hashed)])
+                inserted = set(result.scalars().all())
+                await db.commit()
+
+            report.created += len(inserted)
+            report.existing.extend(u for u in usernames if u not in inserted)
+    return report
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--report",
+                        help="write skipped usernames to this JSON file")
+    args = parser.parse_args(argv)
+
+    await init_db()
+    report = await provision(read_users(args.path, args.format),
+                             batch_size=args.batch_size,
+                             workers=args.workers)
+    print(f"created: {report.created}, "
+          f"already registered: {len(report.existing)}, "
+          f"repeated in file: {len(report.repeated)}, "
+          f"invalid rows: {len(report.invalid)}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report.as_dict(), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
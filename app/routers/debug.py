@@ -0,0 +1,13 @@
+from fastapi import APIRouter, HTTPException
+from app.db import query_profiles
+
+
+router = APIRouter(prefix="/debug", tags=["debug"], include_in_schema=False)
+
+
+@router.get("/queries/{profile_id}")
+async def read_query_profile(profile_id: str):
+    profile = query_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -1,71 +1,486 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import time
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
+from sqlalchemy import delete, insert, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.future import select
 from app.schemas.note import (
+    BulkRequest,
+    BulkResponse,
+    BulkResult,
+    NoteChanges,
     NoteCreate,
     NoteOut,
+    NoteSearchResult,
+    NoteTranslationOut,
     TranslationRequest,
     TranslationResponse,
 )
-from app.models.note import Note
-from app.db import SessionLocal
+from app.models.note import Note, NoteTombstone, NoteVersion
+from app.models.translation import NoteTranslation
+from app.schemas.user import UserOut
+from app.db import get_db
+from app.auth import get_current_user
 from app.translation import translate_text
+from app.note_sync import record_tombstones
+from app.note_events import (
+    NOTE_EVENTS_HEARTBEAT,
+    format_event,
+    note_event_broker,
+)
+from app.note_translations import (
+    NOTE_TRANSLATION_RETRY_AFTER,
+    NOTE_TRANSLATION_TARGETS,
+    forget_translations,
+    mark_stale,
+    note_translation_workers,
+    retry_due,
+)
 
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 1000
+
+SEARCH_SQL = """
+SELECT notes.id, notes.title, notes.content,
+       snippet(notes_fts, -1, '<mark>', '</mark>', '...', 16) AS snippet,
+       bm25(notes_fts, 2.0, 1.0, 0.0) AS score
+FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid
+WHERE notes_fts MATCH :query AND notes.owner_id = :owner_id
+  AND (bm25(notes_fts, 2.0, 1.0, 0.0) > :after_score
+       OR (bm25(notes_fts, 2.0, 1.0, 0.0) = :after_score
+           AND notes.id > :after_id))
+ORDER BY score, notes.id
+LIMIT :limit
+"""
+
+
+async def _bump_version(db: AsyncSession, owner_id: int, count: int = 1):
+    stmt = sqlite_insert(NoteVersion).values(owner_id=owner_id,
+                                             version=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NoteVersion.owner_id],
+        set_={"version": NoteVersion.version + count})
+    result = await db.execute(stmt.returning(NoteVersion.version))
+    return result.scalar_one()
+
+
+async def _current_version(db: AsyncSession, owner_id: int) -> int:
+    version = await db.scalar(select(NoteVersion.version).where(
+        NoteVersion.owner_id == owner_id))
+    return version or 0
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates \
+        or etag.removeprefix("W/") in candidates
+
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=_cache_headers(etag))
 
-async def get_db():
-    async with SessionLocal() as session:
-        yield session
+
+def _note_data(note_id: int, title: str, content: str | None) -> dict:
+    return {"id": note_id, "title": title, "content": content}
 
 
 @router.post("/", response_model=NoteOut)
 async def create_note(note: NoteCreate,
-                      db: AsyncSession = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db),
+                      current_user: UserOut = Depends(get_current_user)):
+    version = await _bump_version(db, current_user.id)
     new_note = Note(
-        **note.model_dump(), owner_id=1)
+        **note.model_dump(), owner_id=current_user.id, change_seq=version)
     db.add(new_note)
+    await db.flush()
+    await mark_stale(db, [(new_note.id, new_note.content)])
     await db.commit()
-    await db.refresh(new_note)
+    note_translation_workers.enqueue([new_note.id])
+    note_event_broker.publish(current_user.id, [(
+        version, "created",
+        _note_data(new_note.id, new_note.title, new_note.content))])
     return new_note
 
 
+async def _stream_notes(bind: AsyncEngine, stmt):
+    async with bind.connect() as conn:
+        result = await conn.stream(
+            stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        async for rows in result.partitions():
+            yield b"".join(to_json(row._asdict()) + b"\n" for row in rows)
+
+
 @router.get("/", response_model=list[NoteOut])
-async def read_notes(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Note))
-    return result.scalars().all()
+async def read_notes(limit: Annotated[int, Query(
+                         ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+                     after: Annotated[int | None, Query(ge=0)] = None,
+                     stream: bool = False,
+                     if_none_match: Annotated[str | None, Header()] = None,
+                     db: AsyncSession = Depends(get_db),
+                     current_user: UserOut = Depends(get_current_user)):
+    version = await _current_version(db, current_user.id)
+    etag = f'W/"{version}-{limit}-{after or 0}{"-s" if stream else ""}"'
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    headers = _cache_headers(etag)
+
+    stmt = select(Note.id, Note.title, Note.content).where(
+        Note.owner_id == current_user.id).order_by(Note.id)
+    if after is not None:
+        stmt = stmt.where(Note.id > after)
+    if stream:
+        return StreamingResponse(_stream_notes(db.bind, stmt),
+                                 media_type="application/x-ndjson",
+                                 headers=headers)
+
+    result = await db.execute(stmt.limit(limit + 1))
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    return Response(to_json([row._asdict() for row in rows]),
+                    media_type="application/json", headers=headers)
+
+
+def _fts_query(q: str) -> str:
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def _parse_search_cursor(after: str | None) -> tuple[float, int]:
+    if after is None:
+        return float("-inf"), 0
+    try:
+        score, note_id = after.rsplit(":", 1)
+        return float(score), int(note_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/search", response_model=list[NoteSearchResult])
+async def search_notes(response: Response,
+                       q: Annotated[str, Query(min_length=1,
+                                               max_length=256)],
+                       limit: Annotated[int, Query(
+                           ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+                       after: str | None = None,
+                       db: AsyncSession = Depends(get_db),
+                       current_user: UserOut = Depends(get_current_user)):
+    query = _fts_query(q)
+    if not query:
+        return []
+    after_score, after_id = _parse_search_cursor(after)
+    result = await db.execute(text(SEARCH_SQL), {
+        "query": f'owner_id : "{current_user.id}" '
+                 f"AND {{title content}} : ({query})",
+        "owner_id": current_user.id,
+        "after_score": after_score,
+        "after_id": after_id,
+        "limit": limit + 1,
+    })
+    hits = result.mappings().all()
+    if len(hits) > limit:
+        hits = hits[:limit]
+        last = hits[-1]
+        response.headers["X-Next-Cursor"] = f"{last['score']!r}:{last['id']}"
+    return hits
+
+
+@router.post("/bulk", response_model=BulkResponse)
+async def bulk_notes(request: BulkRequest,
+                     db: AsyncSession = Depends(get_db),
+                     current_user: UserOut = Depends(get_current_user)):
+    operations = request.operations
+    # bumping first takes the write lock, so the ownership check below
+    # cannot race a concurrent delete
+    version = await _bump_version(db, current_user.id, len(operations))
+    target_ids = {op.id for op in operations if op.op != "create"}
+    owned = set()
+    if target_ids:
+        result = await db.execute(select(Note.id).where(
+            Note.owner_id == current_user.id, Note.id.in_(target_ids)))
+        owned = set(result.scalars().all())
+
+    results = [None] * len(operations)
+    creates, updates, deletes = [], [], []
+    for index, op in enumerate(operations):
+        if op.op == "create":
+            creates.append(index)
+        elif op.id not in owned:
+            results[index] = BulkResult(index=index, op=op.op, id=op.id,
+                                        status="not_found")
+        elif op.op == "update":
+            updates.append(index)
+        else:
+            owned.discard(op.id)
+            deletes.append(index)
+
+    ordered = creates + updates + deletes
+    if len(ordered) < len(operations):
+        # give back the numbers of operations that found nothing
+        version -= len(operations) - len(ordered)
+        await db.execute(update(NoteVersion).where(
+            NoteVersion.owner_id == current_user.id).values(version=version))
+    seqs = {index: version - len(ordered) + 1 + offset
+            for offset, index in enumerate(ordered)}
+
+    changed = []
+    if creates:
+        result = await db.execute(
+            insert(Note).returning(Note.id, sort_by_parameter_order=True),
+            [{"title": operations[i].title,
+              "content": operations[i].content,
+              "owner_id": current_user.id,
+              "change_seq": seqs[i]} for i in creates])
+        for index, note_id in zip(creates, result.scalars().all()):
+            results[index] = BulkResult(index=index, op="create",
+                                        id=note_id, status="created")
+        changed = [(results[i].id, operations[i].content) for i in creates]
+    if updates:
+        await db.execute(update(Note), [
+            {"id": operations[i].id,
+             "title": operations[i].title,
+             "content": operations[i].content,
+             "change_seq": seqs[i]} for i in updates])
+        for index in updates:
+            results[index] = BulkResult(index=index, op="update",
+                                        id=operations[index].id,
+                                        status="updated")
+        changed += [(operations[i].id, operations[i].content)
+                    for i in updates]
+    if changed:
+        await mark_stale(db, changed)
+    if deletes:
+        deleted_ids = [operations[i].id for i in deletes]
+        await forget_translations(db, deleted_ids)
+        await db.execute(delete(Note).where(
+            Note.owner_id == current_user.id,
+            Note.id.in_(deleted_ids)))
+        await record_tombstones(db, current_user.id, [
+            (operations[i].id, seqs[i]) for i in deletes])
+        for index in deletes:
+            results[index] = BulkResult(index=index, op="delete",
+                                        id=operations[index].id,
+                                        status="deleted")
+    events = [(seqs[i], kind, _note_data(results[i].id, operations[i].title,
+                                         operations[i].content))
+              for kind, indexes in (("created", creates),
+                                    ("updated", updates))
+              for i in indexes]
+    events += [(seqs[i], "deleted", {"id": operations[i].id})
+               for i in deletes]
+
+    await db.commit()
+    note_translation_workers.enqueue(
+        dict.fromkeys(note_id for note_id, _ in changed))
+    if events:
+        note_event_broker.publish(current_user.id, events)
+    return BulkResponse(results=results)
 
 
 @router.put("/{note_id}", response_model=NoteOut)
 async def update_note(note_id: int,
                       updated_note: NoteCreate,
-                      db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Note).where(Note.id == note_id))
+                      db: AsyncSession = Depends(get_db),
+                      current_user: UserOut = Depends(get_current_user)):
+    version = await _bump_version(db, current_user.id)
+    result = await db.execute(
+        update(Note)
+        .where(Note.id == note_id, Note.owner_id == current_user.id)
+        .values(title=updated_note.title, content=updated_note.content,
+                change_seq=version)
+        .returning(Note)
+        .execution_options(synchronize_session=False))
     note = result.scalars().first()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    note.title = updated_note.title
-    note.content = updated_note.content
+    await mark_stale(db, [(note.id, note.content)])
     await db.commit()
-    await db.refresh(note)
+    note_translation_workers.enqueue([note.id])
+    note_event_broker.publish(current_user.id, [(
+        version, "updated", _note_data(note.id, note.title, note.content))])
     return note
 
 
 @router.delete("/{note_id}")
 async def delete_note(note_id: int,
-                      db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Note).where(Note.id == note_id))
-    note = result.scalars().first()
-    if not note:
+                      db: AsyncSession = Depends(get_db),
+                      current_user: UserOut = Depends(get_current_user)):
+    version = await _bump_version(db, current_user.id)
+    result = await db.execute(
+        delete(Note)
+        .where(Note.id == note_id, Note.owner_id == current_user.id)
+        .returning(Note.id))
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    await db.delete(note)
+    await forget_translations(db, [note_id])
+    await record_tombstones(db, current_user.id, [(note_id, version)])
     await db.commit()
+    note_event_broker.publish(current_user.id,
+                              [(version, "deleted", {"id": note_id})])
     return {"detail": "Note deleted"}
 
 
+async def _event_stream(subscription, backlog):
+    try:
+        for frame in backlog:
+            yield frame
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscription.queue.get(),
+                                               NOTE_EVENTS_HEARTBEAT)
+            except TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if frame is None:
+                break
+            yield frame
+    finally:
+        note_event_broker.unsubscribe(subscription)
+
+
+@router.get("/changes", response_model=NoteChanges)
+async def read_changes(since: Annotated[int, Query(ge=0)] = 0,
+                       limit: Annotated[int, Query(
+                           ge=1, le=MAX_PAGE_SIZE)] = MAX_PAGE_SIZE,
+                       db: AsyncSession = Depends(get_db),
+                       current_user: UserOut = Depends(get_current_user)):
+    compacted = await db.scalar(select(NoteVersion.compacted_seq).where(
+        NoteVersion.owner_id == current_user.id))
+    if since and since < (compacted or 0):
+        raise HTTPException(status_code=410,
+                            detail="Cursor expired, resync from 0")
+
+    result = await db.execute(
+        select(Note.id, Note.change_seq, Note.title, Note.content)
+        .where(Note.owner_id == current_user.id, Note.change_seq > since)
+        .order_by(Note.change_seq).limit(limit + 1))
+    changes = [{"id": note_id, "seq": seq, "title": title,
+                "content": content}
+               for note_id, seq, title, content in result.all()]
+    if since:
+        result = await db.execute(
+            select(NoteTombstone.note_id, NoteTombstone.change_seq)
+            .where(NoteTombstone.owner_id == current_user.id,
+                   NoteTombstone.change_seq > since)
+            .order_by(NoteTombstone.change_seq).limit(limit + 1))
+        changes += [{"id": note_id, "seq": seq, "deleted": True}
+                    for note_id, seq in result.all()]
+        changes.sort(key=lambda change: change["seq"])
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1]["seq"] if changes else since
+    return {"changes": changes, "cursor": cursor, "has_more": has_more}
+
+
+@router.get("/events")
+async def note_events(
+        last_event_id: Annotated[int | None, Header()] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: UserOut = Depends(get_current_user)):
+    # subscribe first so writes committed while reading the version reach
+    # the stream
+    subscription = note_event_broker.subscribe(current_user.id)
+    try:
+        version = await _current_version(db, current_user.id)
+    except BaseException:
+        note_event_broker.unsubscribe(subscription)
+        raise
+    backlog = []
+    if last_event_id is not None:
+        backlog = note_event_broker.replay(current_user.id, last_event_id)
+        if backlog is None:
+            backlog = []
+            if last_event_id < version:
+                backlog = [format_event(version, "reset",
+                                        {"version": version})]
+    return StreamingResponse(
+        _event_stream(subscription, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/{note_id}", response_model=NoteOut)
+async def read_note(note_id: int,
+                    response: Response,
+                    if_none_match: Annotated[str | None, Header()] = None,
+                    db: AsyncSession = Depends(get_db),
+                    current_user: UserOut = Depends(get_current_user)):
+    version = await _current_version(db, current_user.id)
+    etag = f'W/"{version}-n{note_id}"'
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    result = await db.execute(select(Note).where(
+        Note.id == note_id, Note.owner_id == current_user.id))
+    note = result.scalars().first()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    response.headers.update(_cache_headers(etag))
+    return note
+
+
+@router.get("/{note_id}/translation", response_model=NoteTranslationOut)
+async def read_note_translation(
+        note_id: int,
+        response: Response,
+        target_lang: str = NOTE_TRANSLATION_TARGETS[0],
+        db: AsyncSession = Depends(get_db),
+        current_user: UserOut = Depends(get_current_user)):
+    if target_lang not in NOTE_TRANSLATION_TARGETS:
+        raise HTTPException(
+            status_code=422,
+            detail="target_lang must be one of "
+                   + ", ".join(NOTE_TRANSLATION_TARGETS))
+    result = await db.execute(
+        select(Note.content, NoteTranslation)
+        .outerjoin(NoteTranslation,
+                   (NoteTranslation.note_id == Note.id)
+                   & (NoteTranslation.target_lang == target_lang))
+        .where(Note.id == note_id, Note.owner_id == current_user.id))
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    content, translation = row
+    if translation is not None and translation.status == "ready":
+        return translation
+
+    if translation is not None and translation.status == "failed" \
+            and not retry_due(translation):
+        response.status_code = 202
+        response.headers["Retry-After"] = str(int(
+            translation.updated_at + NOTE_TRANSLATION_RETRY_AFTER
+            - time.time()) + 1)
+        return NoteTranslationOut(note_id=note_id, target_lang=target_lang,
+                                  status="failed")
+
+    if translation is None or translation.status == "failed":
+        await mark_stale(db, [(note_id, content)], [target_lang])
+        await db.commit()
+        note_translation_workers.enqueue([note_id], [target_lang])
+    response.status_code = 202
+    return NoteTranslationOut(note_id=note_id, target_lang=target_lang,
+                              status="pending")
+
+
 @router.post("/translate", response_model=TranslationResponse)
 async def translate_note_text(translation_request:
                               TranslationRequest):
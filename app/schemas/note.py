@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from typing import Annotated, Literal, Union
+from pydantic import BaseModel, Field
+
+BULK_MAX_OPERATIONS = 1000
 
 
 class NoteCreate(BaseModel):
@@ -23,3 +26,63 @@ class TranslationRequest(BaseModel):
 class TranslationResponse(BaseModel):
     original_text: str
     translated_text: str
+
+
+class NoteSearchResult(NoteOut):
+    snippet: str
+    score: float
+
+
+class NoteTranslationOut(BaseModel):
+    note_id: int
+    target_lang: str
+    status: Literal["ready", "pending", "failed"]
+    translated_text: str | None = None
+
+
+class BulkCreate(NoteCreate):
+    op: Literal["create"]
+
+
+class BulkUpdate(NoteCreate):
+    op: Literal["update"]
+    id: int
+
+
+class BulkDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+BulkOperation = Annotated[Union[BulkCreate, BulkUpdate, BulkDelete],
+                          Field(discriminator="op")]
+
+
+class BulkRequest(BaseModel):
+    operations: list[BulkOperation] = Field(min_length=1,
+                                            max_length=BULK_MAX_OPERATIONS)
+
+
+class BulkResult(BaseModel):
+    index: int
+    op: str
+    id: int | None = None
+    status: Literal["created", "updated", "deleted", "not_found"]
+
+
+class BulkResponse(BaseModel):
+    results: list[BulkResult]
+
+
+class NoteChange(BaseModel):
+    id: int
+    seq: int
+    deleted: bool = False
+    title: str | None = None
+    content: str | None = None
+
+
+class NoteChanges(BaseModel):
+    changes: list[NoteChange]
+    cursor: int
+    has_more: bool
@@ -1,37 +1,197 @@
 import aiohttp
+import asyncio
 import os
+import time
+from app.metrics import (
+    translation_upstream_duration,
+    translation_upstream_errors,
+)
+from app.translation_cache import translation_cache
 
+TRANSLATION_API_URL = os.getenv(
+    "TRANSLATION_API_URL",
+    "https://deep-translate1.p.rapidapi.com/language/translate/v2")
+TRANSLATION_POOL_LIMIT = int(os.getenv("TRANSLATION_POOL_LIMIT", "100"))
+TRANSLATION_KEEPALIVE_TIMEOUT = float(
+    os.getenv("TRANSLATION_KEEPALIVE_TIMEOUT", "60"))
+TRANSLATION_CONNECT_TIMEOUT = float(
+    os.getenv("TRANSLATION_CONNECT_TIMEOUT", "5"))
+TRANSLATION_READ_TIMEOUT = float(os.getenv("TRANSLATION_READ_TIMEOUT", "15"))
+TRANSLATION_BATCH_WINDOW = float(
+    os.getenv("TRANSLATION_BATCH_WINDOW_MS", "5")) / 1000
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "32"))
+
+_http_session: aiohttp.ClientSession | None = None
+
+
+def _client_timeout():
+    return aiohttp.ClientTimeout(total=None,
+                                 connect=TRANSLATION_CONNECT_TIMEOUT,
+                                 sock_read=TRANSLATION_READ_TIMEOUT)
+
+
+def create_http_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=TRANSLATION_POOL_LIMIT,
+        keepalive_timeout=TRANSLATION_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector,
+                                 timeout=_client_timeout())
 
-async def translate_text(text: str, source_lang: str = "ru",
-                         target_lang: str = "en") -> str:
-    if not text:
-        return ""
 
-    url = "https://deep-translate1.p.rapidapi.com/language/translate/v2"
+async def start_http_session():
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = create_http_session()
 
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+
+async def _post_translation(session: aiohttp.ClientSession, payload: dict,
+                            headers: dict) -> tuple[bool, list[str] | str]:
+    async with session.post(TRANSLATION_API_URL, json=payload,
+                            headers=headers) as response:
+        if response.status == 200:
+            result = await response.json()
+            translated = result["data"]["translations"]["translatedText"]
+            if isinstance(translated, str):
+                translated = [translated]
+            return True, translated
+        else:
+            error_text = await response.text()
+            print(f"Translation error: {error_text}")
+            return False, f"Translation error: {response.status}"
+
+
+async def _request_translations(texts: list[str], source_lang: str,
+                                target_lang: str
+                                ) -> tuple[bool, list[str] | str]:
     payload = {
-        "q": text,
+        "q": texts if len(texts) > 1 else texts[0],
         "source": source_lang,
         "target": target_lang
     }
 
     headers = {
         "content-type": "application/json",
-        "X-RapidAPI-Key": os.getenv("RAPIDAPI_KEY"),
+        "X-RapidAPI-Key": os.getenv("RAPIDAPI_KEY", ""),
         "X-RapidAPI-Host": "deep-translate1.p.rapidapi.com"
     }
 
+    started = time.perf_counter()
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload,
-                                    headers=headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result["data"]["translations"]["translatedText"][0]
-                else:
-                    error_text = await response.text()
-                    print(f"Translation error: {error_text}")
-                    return f"Translation error: {response.status}"
+        if _http_session is not None:
+            ok, result = await _post_translation(_http_session, payload,
+                                                 headers)
+        else:
+            async with aiohttp.ClientSession(
+                    timeout=_client_timeout()) as session:
+                ok, result = await _post_translation(session, payload,
+                                                     headers)
     except Exception as e:
+        translation_upstream_errors.inc("exception")
         print(f"Translation request failed: {str(e)}")
-        return f"Translation failed: {str(e)}"
+        return False, f"Translation failed: {str(e)}"
+    finally:
+        translation_upstream_duration.observe(time.perf_counter() - started)
+    if not ok:
+        translation_upstream_errors.inc("status")
+    elif len(result) != len(texts):
+        translation_upstream_errors.inc("malformed")
+        print(f"Translation error: expected {len(texts)} results, "
+              f"got {len(result)}")
+        return False, "Translation error: malformed response"
+    return ok, result
+
+
+async def _request_translation(text: str, source_lang: str,
+                               target_lang: str) -> tuple[bool, str]:
+    ok, result = await _request_translations([text], source_lang,
+                                             target_lang)
+    return ok, result[0] if ok else result
+
+
+class TranslationBatcher:
+    def __init__(self, window=TRANSLATION_BATCH_WINDOW,
+                 max_size=TRANSLATION_BATCH_SIZE):
+        self.window = window
+        self.max_size = max_size
+        self._pending = {}
+        self._timers = {}
+        self._inflight = {}
+        self._tasks = set()
+        self.upstream_calls = 0
+        self.requested_texts = 0
+        self.sent_texts = 0
+
+    async def translate(self, text: str, source_lang: str,
+                        target_lang: str) -> tuple[bool, str]:
+        self.requested_texts += 1
+        key = (source_lang, target_lang)
+        future = self._inflight.get((key, text))
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inflight[(key, text)] = future
+            batch = self._pending.setdefault(key, [])
+            batch.append(text)
+            if len(batch) >= self.max_size:
+                self._flush(key)
+            elif len(batch) == 1:
+                self._timers[key] = loop.call_later(self.window,
+                                                    self._flush, key)
+        return await asyncio.shield(future)
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        texts = self._pending.pop(key, None)
+        if texts:
+            task = asyncio.get_running_loop().create_task(
+                self._send(key, texts))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, key, texts):
+        self.upstream_calls += 1
+        self.sent_texts += len(texts)
+        try:
+            ok, result = await _request_translations(texts, *key)
+            if ok:
+                await translation_cache.set_many(
+                    key[0], key[1], list(zip(texts, result)))
+        except Exception as e:
+            ok, result = False, f"Translation failed: {str(e)}"
+        for i, text in enumerate(texts):
+            future = self._inflight.pop((key, text))
+            if not future.done():
+                future.set_result((ok, result[i] if ok else result))
+
+
+translation_batcher = TranslationBatcher()
+
+
+async def translate_with_status(text: str, source_lang: str,
+                                target_lang: str) -> tuple[bool, str]:
+    if not text:
+        return True, ""
+
+    cached = await translation_cache.get(text, source_lang, target_lang)
+    if cached is not None:
+        return True, cached
+
+    return await translation_batcher.translate(text, source_lang,
+                                               target_lang)
+
+
+async def translate_text(text: str, source_lang: str = "ru",
+                         target_lang: str = "en") -> str:
+    _, translated = await translate_with_status(text, source_lang,
+                                                target_lang)
+    return translated
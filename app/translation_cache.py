@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from app.db import SessionLocal
+from app.models.translation import TranslationCacheEntry
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "1024"))
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", "604800"))
+TRANSLATION_CACHE_MAX_ROWS = int(
+    os.getenv("TRANSLATION_CACHE_MAX_ROWS", "100000"))
+PRUNE_EVERY = 100
+
+
+class TranslationCache:
+    def __init__(self, maxsize=TRANSLATION_CACHE_SIZE,
+                 ttl=TRANSLATION_CACHE_TTL,
+                 max_rows=TRANSLATION_CACHE_MAX_ROWS,
+                 session_factory=SessionLocal):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.session_factory = session_factory
+        self._entries = OrderedDict()
+        self._writes = 0
+        self.hits = {"memory": 0, "persistent": 0}
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text, source_lang, target_lang):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{digest}:{source_lang}:{target_lang}"
+
+    def stats(self):
+        return {
+            "memory_hits": self.hits["memory"],
+            "persistent_hits": self.hits["persistent"],
+            "misses": self.misses,
+            "memory_size": len(self._entries),
+        }
+
+    def clear(self):
+        self._entries.clear()
+
+    def _remember(self, key, translated, created_at):
+        self._entries[key] = (created_at + self.ttl, translated)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(self, text, source_lang, target_lang):
+        key = self.make_key(text, source_lang, target_lang)
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, translated = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits["memory"] += 1
+                return translated
+            del self._entries[key]
+
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(TranslationCacheEntry).where(
+                        TranslationCacheEntry.key == key,
+                        TranslationCacheEntry.created_at > now - self.ttl))
+                row = result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logger.warning("Translation cache lookup failed: %s", e)
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits["persistent"] += 1
+        self._remember(key, row.translated_text, row.created_at)
+        return row.translated_text
+
+    async def set(self, text, source_lang, target_lang, translated):
+        await self.set_many(source_lang, target_lang, [(text, translated)])
+
+    async def set_many(self, source_lang, target_lang, pairs):
+        now = time.time()
+        rows = []
+        for text, translated in pairs:
+            key = self.make_key(text, source_lang, target_lang)
+            self._remember(key, translated, now)
+            rows.append({"key": key, "translated_text": translated,
+                         "created_at": now})
+
+        stmt = insert(TranslationCacheEntry)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TranslationCacheEntry.key],
+            set_={"translated_text": stmt.excluded.translated_text,
+                  "created_at": stmt.excluded.created_at})
+        try:
+            async with self.session_factory() as session:
+                await session.execute(stmt, rows)
+                previous = self._writes
+                self._writes += len(rows)
+                if self._writes // PRUNE_EVERY != previous // PRUNE_EVERY:
+                    await self._prune(session, now)
+                await session.commit()
+        except SQLAlchemyError as e:
+            logger.warning("Translation cache write failed: %s", e)
+
+    async def _prune(self, session, now):
+        await session.execute(delete(TranslationCacheEntry).where(
+            TranslationCacheEntry.created_at <= now - self.ttl))
+        overflow = (select(TranslationCacheEntry.key)
+                    .order_by(TranslationCacheEntry.created_at.desc())
+                    .offset(self.max_rows))
+        await session.execute(delete(TranslationCacheEntry).where(
+            TranslationCacheEntry.key.in_(overflow)))
+
+
+translation_cache = TranslationCache()
@@ -0,0 +1,66 @@
+"""Per-request authentication overhead with and without the auth caches.
+
+    python -m benchmarks.auth_cache --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import auth  # noqa: E402
+from app.db import Base, make_engine  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+async def measure(Session, credentials, requests, cached):
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+    started = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            auth.token_cache.clear()
+            auth.user_cache.clear()
+        async with Session() as db:
+            await auth.get_current_user(credentials=credentials, db=db)
+    return (time.perf_counter() - started) / requests
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            echo=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        Session = sessionmaker(engine, class_=AsyncSession,
+                               expire_on_commit=False)
+        async with Session() as db:
+            db.add(User(username="bench", hashed_password="x"))
+            await db.commit()
+
+        credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer",
+            credentials=auth.create_access_token({"sub": "bench"}))
+        uncached = await measure(Session, credentials, args.requests, False)
+        cached = await measure(Session, credentials, args.requests, True)
+        await engine.dispose()
+
+    print(f"uncached: {uncached * 1e6:.1f} us/request")
+    print(f"  cached: {cached * 1e6:.1f} us/request")
+    print(f" speedup: {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
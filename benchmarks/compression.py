@@ -0,0 +1,72 @@
+"""Bytes saved and CPU cost of each available response encoding.
+
+    python -m benchmarks.compression --repeat 50
+
+Payloads are note lists shaped like the API's responses: a single note, a
+default page, a full page and a streamed NDJSON export (compressed chunk
+by chunk, the way the middleware handles streaming responses).
+"""
+import argparse
+import random
+import statistics
+import time
+
+from pydantic_core import to_json
+
+from app.compression import ENCODERS
+
+WORDS = ("заметка", "встреча", "купить", "молоко", "проект", "отчёт",
+         "note", "meeting", "deadline", "review", "draft", "call", "email",
+         "tomorrow", "перевод", "idea", "список", "important", "todo")
+
+
+def make_notes(count, seed=0):
+    rng = random.Random(seed)
+    return [{"id": i,
+             "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 6))),
+             "content": " ".join(rng.choices(WORDS,
+                                             k=rng.randint(10, 120)))}
+            for i in range(1, count + 1)]
+
+
+def payloads():
+    return {
+        "one note": [to_json(make_notes(1))],
+        "page of 100": [to_json(make_notes(100))],
+        "page of 1000": [to_json(make_notes(1000))],
+        "ndjson 10k": [
+            b"".join(to_json(note) + b"\n" for note in chunk)
+            for chunk in (make_notes(10000)[i:i + 1000]
+                          for i in range(0, 10000, 1000))],
+    }
+
+
+def encode(encoder_cls, chunks):
+    encoder = encoder_cls()
+    out = [encoder.compress(chunk) for chunk in chunks[:-1]]
+    out.append(encoder.finish(chunks[-1]))
+    return sum(len(part) for part in out)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for name, chunks in payloads().items():
+        size = sum(len(chunk) for chunk in chunks)
+        print(f"{name}: {size} bytes")
+        for encoding, encoder_cls in ENCODERS.items():
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                compressed = encode(encoder_cls, chunks)
+                timings.append(time.perf_counter() - started)
+            print(f"  {encoding:>5}: {compressed} bytes "
+                  f"({100 * (1 - compressed / size):.1f}% saved), "
+                  f"{statistics.median(timings) * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare notes CRUD throughput under the old and tuned engine profiles.
+
+    python -m benchmarks.db_profile --ops 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, make_engine
+from app.models.note import Note
+from app.models.user import User
+
+
+PROFILES = {
+    "legacy": {"echo": True, "pragmas": {}},
+    "tuned": {},
+}
+
+
+async def _crud_cycle(Session, owner_id, i):
+    async with Session() as db:
+        note = Note(title=f"Note {i}", content="x" * 200, owner_id=owner_id)
+        db.add(note)
+        await db.commit()
+
+        await db.execute(select(Note).where(
+            Note.owner_id == owner_id).order_by(Note.id).limit(50))
+
+        await db.execute(update(Note).where(Note.id == note.id).values(
+            title=f"Updated {i}"))
+        await db.commit()
+
+        await db.execute(delete(Note).where(Note.id == note.id))
+        await db.commit()
+
+
+async def run_profile(name, ops, concurrency):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            engine = make_engine(url, **PROFILES[name])
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            Session = sessionmaker(engine, class_=AsyncSession,
+                                   expire_on_commit=False)
+            async with Session() as db:
+                user = User(username="bench", hashed_password="x")
+                db.add(user)
+                await db.commit()
+
+            queue = asyncio.Queue()
+            for i in range(ops):
+                queue.put_nowait(i)
+
+            async def worker():
+                while not queue.empty():
+                    await _crud_cycle(Session, user.id, queue.get_nowait())
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            await engine.dispose()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=1000,
+                        help="CRUD cycles per profile")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    results = {}
+    for name in PROFILES:
+        elapsed = await run_profile(name, args.ops, args.concurrency)
+        results[name] = args.ops / elapsed
+        print(f"{name:>8}: {args.ops} cycles in {elapsed:.2f}s "
+              f"({results[name]:.0f} cycles/s)")
+    print(f"speedup: {results['tuned'] / results['legacy']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
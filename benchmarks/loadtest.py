@@ -0,0 +1,181 @@
+"""Run a locust scenario headless and gate it on per-endpoint SLOs.
+
+    python -m benchmarks.loadtest read-heavy --users 50 --run-time 1m
+    python -m benchmarks.loadtest login-storm --host http://staging:8000
+
+Without --host the app is started with uvicorn on a throwaway database and
+pointed at a local translation stub. Latency percentiles per endpoint are
+compared with benchmarks/slo.json (milliseconds); any breach exits with
+status 1. The JSON report is meant to be kept and diffed between releases.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLO_PATH = os.path.join(ROOT, "benchmarks", "slo.json")
+
+SCENARIOS = {
+    "read-heavy": ["ReaderUser", "WriterUser"],
+    "write-heavy": ["WriterUser", "BulkWriterUser"],
+    "translate-heavy": ["TranslatorUser"],
+    "login-storm": ["LoginStormUser"],
+}
+PERCENTILES = {"p50": "50%", "p95": "95%", "p99": "99%"}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+@contextlib.contextmanager
+def local_app(workdir, stub_delay):
+    stub_port, app_port = free_port(), free_port()
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "loadtest-secret")
+    env.setdefault("ALGORITHM", "HS256")
+    env["DATABASE_URL"] = \
+        f"sqlite+aiosqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    env["TRANSLATION_API_URL"] = \
+        f"http://127.0.0.1:{stub_port}/language/translate/v2"
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.translation_stub",
+             "--port", str(stub_port), "--delay", str(stub_delay)],
+            cwd=ROOT, env=env),
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--port", str(app_port), "--log-level", "warning"],
+            cwd=ROOT, env=env),
+    ]
+    try:
+        host = f"http://127.0.0.1:{app_port}"
+        wait_until_up(f"{host}/openapi.json")
+        yield host
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def run_locust(scenario, host, users, spawn_rate, run_time, csv_prefix):
+    command = [
+        sys.executable, "-m", "locust", "-f",
+        os.path.join(ROOT, "locustfile.py"), "--headless",
+        "--host", host, "--users", str(users),
+        "--spawn-rate", str(spawn_rate), "--run-time", run_time,
+        "--csv", csv_prefix, "--only-summary", "--exit-code-on-error", "0",
+        *SCENARIOS[scenario]]
+    subprocess.run(command, cwd=ROOT, check=True)
+
+
+def read_stats(csv_prefix):
+    endpoints = {}
+    with open(f"{csv_prefix}_stats.csv", newline="") as f:
+        for row in csv.DictReader(f):
+            requests = int(row["Request Count"])
+            failures = int(row["Failure Count"])
+            stats = {"requests": requests, "failures": failures,
+                     "failure_ratio": failures / requests if requests else 0,
+                     "rps": float(row["Requests/s"]),
+                     "avg": float(row["Average Response Time"])}
+            for name, column in PERCENTILES.items():
+                value = row[column]
+                stats[name] = float(value) if value != "N/A" else None
+            endpoints[row["Name"]] = stats
+    return endpoints
+
+
+def check_slo(endpoints, slo):
+    violations = []
+    for name, limits in slo.items():
+        stats = endpoints.get(name)
+        if stats is None:
+            violations.append(f"{name}: no requests recorded")
+            continue
+        for key, limit in limits.items():
+            if key == "max_failure_ratio":
+                actual = stats["failure_ratio"]
+            else:
+                actual = stats[key]
+            if actual is not None and actual > limit:
+                violations.append(f"{name}: {key} {actual:g} > {limit:g}")
+    return violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("scenario", choices=SCENARIOS)
+    parser.add_argument("--host",
+                        help="test a running server instead of starting one")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--spawn-rate", type=float, default=5)
+    parser.add_argument("--run-time", default="30s")
+    parser.add_argument("--stub-delay", type=float, default=0.02,
+                        help="translation stub latency in seconds")
+    parser.add_argument("--slo", default=SLO_PATH)
+    parser.add_argument("--report",
+                        help="JSON report path "
+                             "(default: loadtest-<scenario>.json)")
+    args = parser.parse_args(argv)
+
+    with open(args.slo, encoding="utf-8") as f:
+        slo = json.load(f).get(args.scenario, {})
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_prefix = os.path.join(workdir, "stats")
+        with contextlib.ExitStack() as stack:
+            host = args.host or stack.enter_context(
+                local_app(workdir, args.stub_delay))
+            run_locust(args.scenario, host, args.users, args.spawn_rate,
+                       args.run_time, csv_prefix)
+        endpoints = read_stats(csv_prefix)
+
+    violations = check_slo(endpoints, slo)
+    report = {
+        "scenario": args.scenario,
+        "users": args.users,
+        "run_time": args.run_time,
+        "endpoints": endpoints,
+        "slo": slo,
+        "violations": violations,
+        "passed": not violations,
+    }
+    with open(args.report or f"loadtest-{args.scenario}.json", "w",
+              encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    for name, stats in sorted(endpoints.items()):
+        print(f"{name:<32} {stats['requests']:>7} req "
+              f"{stats['failures']:>5} fail  p50 {stats['p50']} "
+              f"p95 {stats['p95']} p99 {stats['p99']} ms")
+    for violation in violations:
+        print(f"SLO breach: {violation}")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""Microbenchmarks for the backend hot paths, checked against a baseline.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --only notes --threshold 0.1
+    python -m benchmarks.micro --update-baseline
+
+Every request/response handler is covered except GET /notes/events, a
+long-lived stream whose cost is per event rather than per call, and the
+operational /metrics and /debug endpoints. Each benchmark reports the
+median time per call over --repeat rounds.
+Results are compared with benchmarks/baseline.json and any benchmark slower
+than baseline * (1 + threshold) is reported as a regression (exit status
+1). Baselines are machine specific: regenerate them with --update-baseline
+on the machine the numbers are compared on.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from pydantic_core import to_json  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import auth, translation  # noqa: E402
+from app.db import Base, get_db, make_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.note_translations import note_translation_workers  # noqa: E402
+from app.schemas.note import BULK_MAX_OPERATIONS, NoteOut  # noqa: E402
+from app.translation_cache import translation_cache  # noqa: E402
+from benchmarks.translation_stub import start_stub  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+
+BENCHMARKS = {}
+
+
+def benchmark(name, number):
+    def register(factory):
+        BENCHMARKS[name] = (factory, number)
+        return factory
+    return register
+
+
+class Context:
+    def __init__(self, client):
+        self.client = client
+        self.headers = {}
+        self.note_ids = []
+
+    async def call(self, method, url, **kwargs):
+        kwargs.setdefault("headers", self.headers)
+        response = await self.client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url}: {response.status_code}")
+        return response
+
+    async def create_notes(self, count):
+        note_ids = []
+        for start in range(0, count, BULK_MAX_OPERATIONS):
+            response = await self.call("POST", "/notes/bulk", json={
+                "operations": [
+                    {"op": "create", "title": f"Заметка {i}",
+                     "content": "купить молоко и хлеб " * 10}
+                    for i in range(start,
+                                   min(start + BULK_MAX_OPERATIONS, count))]})
+            note_ids += [result["id"]
+                         for result in response.json()["results"]]
+        return note_ids
+
+
+@benchmark("auth.create_access_token", number=2000)
+async def bench_create_token(ctx, calls):
+    return lambda: auth.create_access_token({"sub": "bench"})
+
+
+@benchmark("auth.get_password_hash", number=3)
+async def bench_password_hash(ctx, calls):
+    return lambda: auth.get_password_hash("password")
+
+
+@benchmark("auth.verify_password", number=3)
+async def bench_verify_password(ctx, calls):
+    hashed = auth.get_password_hash("password")
+    return lambda: auth.verify_password("password", hashed)
+
+
+NOTES = [{"id": i, "title": f"Note {i}", "content": "x" * 200}
+         for i in range(1000)]
+notes_adapter = TypeAdapter(list[NoteOut])
+
+
+@benchmark("serialize.NoteOut_1000", number=50)
+async def bench_serialize_models(ctx, calls):
+    return lambda: notes_adapter.dump_json(
+        notes_adapter.validate_python(NOTES))
+
+
+@benchmark("serialize.to_json_1000", number=200)
+async def bench_serialize_rows(ctx, calls):
+    return lambda: to_json(NOTES)
+
+
+@benchmark("users.register", number=3)
+async def bench_register(ctx, calls):
+    return lambda: ctx.call("POST", "/users/register", json={
+        "username": f"bench-{uuid.uuid4()}", "password": "password"})
+
+
+@benchmark("users.login", number=3)
+async def bench_login(ctx, calls):
+    return lambda: ctx.call("POST", "/users/login", json={
+        "username": "bench", "password": "password"})
+
+
+@benchmark("notes.create", number=200)
+async def bench_create_note(ctx, calls):
+    return lambda: ctx.call("POST", "/notes/", json={
+        "title": "Новая заметка", "content": "позвонить маме"})
+
+
+@benchmark("notes.list_100", number=200)
+async def bench_list_notes(ctx, calls):
+    return lambda: ctx.call("GET", "/notes/", params={"limit": 100})
+
+
+@benchmark("notes.list_not_modified", number=500)
+async def bench_list_not_modified(ctx, calls):
+    response = await ctx.call("GET", "/notes/", params={"limit": 100})
+    headers = {**ctx.headers, "If-None-Match": response.headers["ETag"]}
+    return lambda: ctx.call("GET", "/notes/", params={"limit": 100},
+                            headers=headers)
+
+
+@benchmark("notes.read_one", number=500)
+async def bench_read_note(ctx, calls):
+    return lambda: ctx.call("GET", f"/notes/{ctx.note_ids[0]}")
+
+
+@benchmark("notes.search", number=200)
+async def bench_search(ctx, calls):
+    return lambda: ctx.call("GET", "/notes/search", params={"q": "молоко"})
+
+
+@benchmark("notes.changes", number=200)
+async def bench_changes(ctx, calls):
+    return lambda: ctx.call("GET", "/notes/changes", params={"since": 0})
+
+
+@benchmark("notes.update", number=200)
+async def bench_update_note(ctx, calls):
+    return lambda: ctx.call("PUT", f"/notes/{ctx.note_ids[1]}", json={
+        "title": "Обновлено", "content": str(uuid.uuid4())})
+
+
+@benchmark("notes.delete", number=200)
+async def bench_delete_note(ctx, calls):
+    note_ids = iter(await ctx.create_notes(calls))
+    return lambda: ctx.call("DELETE", f"/notes/{next(note_ids)}")
+
+
+@benchmark("notes.bulk_100", number=20)
+async def bench_bulk(ctx, calls):
+    return lambda: ctx.create_notes(100)
+
+
+@benchmark("notes.translation", number=500)
+async def bench_note_translation(ctx, calls):
+    return lambda: ctx.call("GET", f"/notes/{ctx.note_ids[0]}/translation")
+
+
+@benchmark("notes.translate", number=500)
+async def bench_translate_endpoint(ctx, calls):
+    return lambda: ctx.call("POST", "/notes/translate", json={
+        "text": "купить молоко", "source_lang": "ru", "target_lang": "en"})
+
+
+@benchmark("translation.translate_text_cold", number=50)
+async def bench_translate_cold(ctx, calls):
+    return lambda: translation.translate_text(str(uuid.uuid4()))
+
+
+@benchmark("translation.translate_text_cached", number=1000)
+async def bench_translate_cached(ctx, calls):
+    await translation.translate_text("привет мир")
+    return lambda: translation.translate_text("привет мир")
+
+
+async def measure(op, number, repeat):
+    asynchronous = None
+    timings = []
+    for round_no in range(repeat + 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            result = op()
+            if asynchronous is None:
+                asynchronous = inspect.isawaitable(result)
+            if asynchronous:
+                await result
+        elapsed = (time.perf_counter() - started) / number
+        # the first round only warms caches and connections up
+        if round_no:
+            timings.append(elapsed)
+    return statistics.median(timings)
+
+
+async def run(selected, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            echo=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        Session = sessionmaker(engine, class_=AsyncSession,
+                               expire_on_commit=False)
+
+        async def override_get_db():
+            async with Session() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        translation_cache.session_factory = Session
+        note_translation_workers.session_factory = Session
+        stub, url = await start_stub()
+        translation.TRANSLATION_API_URL = url
+        await translation.start_http_session()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://bench") as client:
+            ctx = Context(client)
+            await ctx.call("POST", "/users/register", json={
+                "username": "bench", "password": "password"})
+            response = await ctx.call("POST", "/users/login", json={
+                "username": "bench", "password": "password"})
+            token = response.json()["access_token"]
+            ctx.headers = {"Authorization": f"Bearer {token}"}
+            ctx.note_ids = await ctx.create_notes(1000)
+
+            for name in selected:
+                factory, number = BENCHMARKS[name]
+                op = await factory(ctx, number * (repeat + 1))
+                results[name] = await measure(op, number, repeat)
+                print(f"{name:<36} {results[name] * 1e6:>12.1f} us")
+
+        await translation.close_http_session()
+        await stub.cleanup()
+        await engine.dispose()
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, seconds in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = seconds / reference
+        if ratio > 1 + threshold:
+            regressions.append((name, reference, seconds, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--only", default="",
+                        help="run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    selected = [name for name in BENCHMARKS if args.only in name]
+    results = asyncio.run(run(selected, args.repeat))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.update_baseline:
+        baseline.setdefault("results", {}).update(results)
+        baseline["machine"] = {"python": platform.python_version(),
+                               "platform": platform.platform(),
+                               "processor": platform.machine()}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline.get("results", {}),
+                          args.threshold)
+    for name, reference, seconds, ratio in regressions:
+        print(f"REGRESSION {name}: {reference * 1e6:.1f} us -> "
+              f"{seconds * 1e6:.1f} us ({ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Page through an owner's notes via ORM + Pydantic vs Core rows + to_json.
+
+    python -m benchmarks.read_path --sizes 1000,100000,1000000 --page 1000
+
+The ORM path mirrors the old handler: hydrate Note objects, validate them
+through NoteOut and let FastAPI dump and json-encode the result. The Core
+path selects the three columns and encodes the rows straight to bytes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, make_engine
+from app.models.note import Note
+from app.models.user import User
+from app.schemas.note import NoteOut
+
+SEED_BATCH = 10000
+notes_adapter = TypeAdapter(list[NoteOut])
+
+
+async def orm_page(db, owner_id, after, limit):
+    stmt = select(Note).where(Note.owner_id == owner_id).where(
+        Note.id > after).order_by(Note.id).limit(limit + 1)
+    notes = (await db.execute(stmt)).scalars().all()[:limit]
+    body = json.dumps(notes_adapter.dump_python(
+        notes_adapter.validate_python(notes, from_attributes=True),
+        mode="json")).encode("utf-8")
+    return body, notes[-1].id if notes else None
+
+
+async def core_page(db, owner_id, after, limit):
+    stmt = select(Note.id, Note.title, Note.content).where(
+        Note.owner_id == owner_id).where(
+        Note.id > after).order_by(Note.id).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()[:limit]
+    body = to_json([row._asdict() for row in rows])
+    return body, rows[-1].id if rows else None
+
+
+async def walk(Session, page_func, owner_id, limit):
+    after, pages = 0, 0
+    started = time.perf_counter()
+    while after is not None:
+        # a fresh session per page, as each page is a separate request
+        async with Session() as db:
+            _, after = await page_func(db, owner_id, after, limit)
+        pages += 1
+    return time.perf_counter() - started, pages
+
+
+async def run_size(size, limit):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            echo=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        Session = sessionmaker(engine, class_=AsyncSession,
+                               expire_on_commit=False)
+        async with Session() as db:
+            user = User(username="bench", hashed_password="x")
+            db.add(user)
+            await db.commit()
+            for start in range(0, size, SEED_BATCH):
+                await db.execute(insert(Note), [
+                    {"title": f"Note {i}", "content": "x" * 200,
+                     "owner_id": user.id}
+                    for i in range(start, min(start + SEED_BATCH, size))])
+            await db.commit()
+
+        orm, pages = await walk(Session, orm_page, user.id, limit)
+        core, _ = await walk(Session, core_page, user.id, limit)
+        await engine.dispose()
+    return orm, core, pages
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="comma-separated note counts")
+    parser.add_argument("--page", type=int, default=1000)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        orm, core, pages = await run_size(size, args.page)
+        print(f"{size:>8} notes, {pages} pages: "
+              f"orm {orm * 1e3 / pages:.2f} ms/page, "
+              f"core {core * 1e3 / pages:.2f} ms/page, "
+              f"speedup {orm / core:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
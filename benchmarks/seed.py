@@ -0,0 +1,163 @@
+"""Seed a database with synthetic users and notes at production scale.
+
+    python -m benchmarks.seed --users 10000 --notes 2000000
+    python -m benchmarks.seed --database-url sqlite+aiosqlite:///./big.db \\
+        --notes 1000000 --size-dist lognormal --mean-size 600 --skew 1.2
+
+Notes are spread over owners by a Zipf law (--skew 0 is uniform) and their
+content length follows --size-dist. Rows go in through multi-row inserts
+in large transactions; the full-text triggers are dropped while seeding and
+the index is rebuilt once at the end. Every seeded user has the password
+"password".
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import time
+
+from sqlalchemy import insert
+
+from app.auth import get_password_hash
+from app.db import DATABASE_URL, SQLITE_PRAGMAS, Base, make_engine
+from app.models.note import (
+    NOTES_FTS_DDL, NOTES_FTS_TRIGGERS, Note, NoteVersion)
+from app.models.user import User
+
+WORDS = ("заметка", "встреча", "купить", "молоко", "проект", "отчёт",
+         "перевод", "список", "идея", "звонок", "письмо", "завтра", "note",
+         "meeting", "deadline", "review", "draft", "release", "budget",
+         "погода", "снег", "дом", "работа", "план", "задача", "вопрос")
+TEXT_WORDS = 200000
+
+
+def check_params(users, notes, mean_size, max_size, batch_size):
+    if users < 0 or notes < 0:
+        raise ValueError("--users and --notes must not be negative")
+    if notes and not users:
+        raise ValueError("notes need at least one user to own them")
+    if not 1 <= mean_size <= max_size:
+        raise ValueError("--mean-size must be between 1 and --max-size")
+    if max_size >= TEXT_WORDS:
+        raise ValueError(f"--max-size must be below {TEXT_WORDS}")
+    if batch_size < 1:
+        raise ValueError("--batch-size must be at least 1")
+
+
+def size_sampler(dist, mean, max_size, rng):
+    if dist == "fixed":
+        return lambda: mean
+    if dist == "uniform":
+        return lambda: rng.randint(1, 2 * mean)
+    # lognormal with the requested mean and a long tail of big notes
+    sigma = 1.0
+    mu = math.log(mean) - sigma ** 2 / 2
+    return lambda: max(1, min(max_size, int(rng.lognormvariate(mu, sigma))))
+
+
+def owner_weights(count, skew):
+    return list(itertools.accumulate(
+        1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+async def seed(engine, users=1000, notes=100000, size_dist="lognormal",
+               mean_size=400, max_size=20000, skew=1.0, batch_size=20000,
+               seed_value=0, username_prefix="seed"):
+    rng = random.Random(seed_value)
+    check_params(users, notes, mean_size, max_size, batch_size)
+    text = " ".join(rng.choices(WORDS, k=TEXT_WORDS))
+    next_size = size_sampler(size_dist, mean_size, max_size, rng)
+    password_hash = get_password_hash("password")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for trigger in NOTES_FTS_TRIGGERS:
+            await conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    try:
+        owner_ids = []
+        for start in range(0, users, batch_size):
+            async with engine.begin() as conn:
+                result = await conn.execute(
+                    insert(User).returning(User.id,
+                                           sort_by_parameter_order=True),
+                    [{"username": f"{username_prefix}{i}",
+                      "hashed_password": password_hash}
+                     for i in range(start, min(start + batch_size, users))])
+                owner_ids += result.scalars().all()
+
+        cum_weights = owner_weights(len(owner_ids), skew)
+        versions = dict.fromkeys(owner_ids, 0)
+        for start in range(0, notes, batch_size):
+            count = min(batch_size, notes - start)
+            rows = []
+            for owner_id in rng.choices(owner_ids, cum_weights=cum_weights,
+                                        k=count):
+                size = next_size()
+                offset = rng.randrange(len(text) - max_size)
+                versions[owner_id] += 1
+                rows.append({"title": text[offset:offset + rng.randint(8, 60)],
+                             "content": text[offset:offset + size],
+                             "owner_id": owner_id,
+                             "change_seq": versions[owner_id]})
+            async with engine.begin() as conn:
+                await conn.execute(insert(Note), rows)
+
+        async with engine.begin() as conn:
+            owners = [{"owner_id": owner_id, "version": version,
+                       "compacted_seq": 0}
+                      for owner_id, version in versions.items() if version]
+            for start in range(0, len(owners), batch_size):
+                await conn.execute(insert(NoteVersion),
+                                   owners[start:start + batch_size])
+    finally:
+        async with engine.begin() as conn:
+            for statement in NOTES_FTS_DDL[1:]:
+                await conn.exec_driver_sql(statement)
+            await conn.exec_driver_sql(
+                "INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+    return owner_ids
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--size-dist", default="lognormal",
+                        choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--mean-size", type=int, default=400,
+                        help="mean note content length in characters")
+    parser.add_argument("--max-size", type=int, default=20000)
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="Zipf exponent of notes per owner, 0 = uniform")
+    parser.add_argument("--batch-size", type=int, default=20000,
+                        help="rows per transaction")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--username-prefix", default="seed")
+    args = parser.parse_args()
+    try:
+        check_params(args.users, args.notes, args.mean_size, args.max_size,
+                     args.batch_size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # bulk loading only: durability of a half-seeded database is moot
+    engine = make_engine(args.database_url, echo=False,
+                         pragmas={**SQLITE_PRAGMAS, "synchronous": "OFF"})
+    started = time.perf_counter()
+    await seed(engine, users=args.users, notes=args.notes,
+               size_dist=args.size_dist, mean_size=args.mean_size,
+               max_size=args.max_size, skew=args.skew,
+               batch_size=args.batch_size, seed_value=args.seed,
+               username_prefix=args.username_prefix)
+    await engine.dispose()
+    elapsed = time.perf_counter() - started
+    print(f"seeded {args.users} users and {args.notes} notes "
+          f"in {elapsed:.1f}s ({args.notes / elapsed:.0f} notes/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""Per-call ClientSession versus the shared pooled session.
+
+    python -m benchmarks.translation_session --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app import translation
+from benchmarks.translation_stub import start_stub
+
+
+async def run_mode(shared, requests, concurrency):
+    if shared:
+        await translation.start_http_session()
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            ok, _ = await translation._request_translation(
+                f"text {i}", "ru", "en")
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                raise RuntimeError("stub request failed")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if shared:
+        await translation.close_http_session()
+    latencies.sort()
+    return {
+        "throughput": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    runner, url = await start_stub()
+    translation.TRANSLATION_API_URL = url
+    try:
+        results = {}
+        for name, shared in (("per-call", False), ("pooled", True)):
+            results[name] = await run_mode(shared, args.requests,
+                                           args.concurrency)
+            r = results[name]
+            print(f"{name:>9}: {r['throughput']:.0f} req/s, "
+                  f"p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms")
+        speedup = (results["pooled"]["throughput"]
+                   / results["per-call"]["throughput"])
+        print(f"speedup: {speedup:.2f}x")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
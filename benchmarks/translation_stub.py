@@ -0,0 +1,59 @@
+"""Local stand-in for the RapidAPI translate endpoint.
+
+    python -m benchmarks.translation_stub --port 8099 --delay 0.02
+
+Point the backend at it with
+TRANSLATION_API_URL=http://127.0.0.1:8099/language/translate/v2.
+"""
+import argparse
+import asyncio
+
+from aiohttp import web
+
+TRANSLATE_PATH = "/language/translate/v2"
+STUB_STATS = web.AppKey("stub_stats", dict)
+
+
+def make_stub_app(delay=0.0):
+    app = web.Application()
+    stats = app[STUB_STATS] = {"requests": 0, "texts": 0}
+
+    async def translate(request):
+        payload = await request.json()
+        texts = payload["q"] if isinstance(payload["q"], list) \
+            else [payload["q"]]
+        stats["requests"] += 1
+        stats["texts"] += len(texts)
+        if delay:
+            await asyncio.sleep(delay)
+        translated = [f"[{payload['target']}] {text}" for text in texts]
+        return web.json_response(
+            {"data": {"translations": {"translatedText": translated}}})
+
+    app.router.add_post(TRANSLATE_PATH, translate)
+    return app
+
+
+async def start_stub(host="127.0.0.1", port=0, delay=0.0):
+    app = make_stub_app(delay)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}{TRANSLATE_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="seconds to wait before answering")
+    args = parser.parse_args()
+    web.run_app(make_stub_app(args.delay), host=args.host, port=args.port,
+                access_log=None)
+
+
+if __name__ == "__main__":
+    main()
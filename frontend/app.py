@@ -1,12 +1,38 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 
 
 API_URL = "http://localhost:8000"
+NOTES_CACHE_TTL = 300
+NOTES_PAGE_SIZE = 20
+NOTES_CACHE_ENTRIES = 1000
 
 st.set_page_config(page_title="Simple Notes App",
                    page_icon="📝")
 
+
+@st.cache_resource
+def get_http_session():
+    session = requests.Session()
+    session.mount(API_URL, HTTPAdapter(pool_connections=1, pool_maxsize=10))
+    return session
+
+
+# cached per token and per session version: a write bumps the version of
+# the writing session only instead of clearing every session's pages
+@st.cache_data(ttl=NOTES_CACHE_TTL, max_entries=NOTES_CACHE_ENTRIES,
+               show_spinner=False)
+def fetch_notes(token, version, after=None, limit=NOTES_PAGE_SIZE):
+    res = get_http_session().get(
+        f"{API_URL}/notes/", params={"limit": limit, "after": after},
+        headers={"Authorization": f"Bearer {token}"})
+    res.raise_for_status()
+    return res.json(), res.headers.get("X-Next-Cursor")
+
+
+http = get_http_session()
+
 st.title("📝 Simple Notes App")
 
 # --- SESSION STATE INITIALIZATION ---
@@ -14,6 +40,12 @@ if "token" not in st.session_state:
     st.session_state.token = None
 if "username" not in st.session_state:
     st.session_state.username = None
+if "page_cursors" not in st.session_state:
+    st.session_state.page_cursors = [None]
+if "editing" not in st.session_state:
+    st.session_state.editing = None
+if "notes_version" not in st.session_state:
+    st.session_state.notes_version = 0
 
 
 # --- REGISTRATION SECTION ---
@@ -23,7 +55,7 @@ with st.expander("Don't have an account? Register here"):
                                  key="register_password")
     if st.button("Register"):
         if new_username and new_password:
-            res = requests.post(
+            res = http.post(
                 f"{API_URL}/users/register",
                 json={"username": new_username,
                       "password": new_password}
@@ -44,7 +76,7 @@ password = st.text_input("Password", type="password",
 
 if st.button("Login"):
     if username and password:
-        res = requests.post(
+        res = http.post(
             f"{API_URL}/users/login",
             json={"username": username, "password": password}
         )
@@ -64,6 +96,9 @@ if st.session_state.token:
     if st.button("Logout"):
         st.session_state.token = None
         st.session_state.username = None
+        st.session_state.page_cursors = [None]
+        st.session_state.editing = None
+        st.session_state.notes_version += 1
         st.success("Logged out.")
 
 
@@ -77,30 +112,41 @@ if st.session_state.token:
 
     if st.button("Add Note"):
         headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        res = requests.post(f"{API_URL}/notes/",
-                            json={"title": title,
-                                  "content": content}, headers=headers)
+        res = http.post(f"{API_URL}/notes/",
+                        json={"title": title,
+                              "content": content}, headers=headers)
         if res.ok:
+            st.session_state.notes_version += 1
             st.success("Note added!")
         else:
             st.error("Failed to add note")
 
-        st.subheader("Your Notes")
+    st.subheader("Your Notes")
     headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    res = requests.get(f"{API_URL}/notes/", headers=headers)
+    cursors = st.session_state.page_cursors
+    try:
+        notes, next_cursor = fetch_notes(st.session_state.token,
+                                         st.session_state.notes_version,
+                                         after=cursors[-1])
+    except requests.RequestException:
+        notes = None
+
+    if notes is not None:
+        if not notes and len(cursors) > 1:
+            # the last page emptied out, step back to the previous one
+            cursors.pop()
+            st.rerun()
 
-    if res.ok:
-        notes = res.json()
         for note in notes:
             st.markdown("---")
             st.markdown(f"### ✏️ {note['title']}")
             st.write(note["content"])
 
-            if st.button("Translate to English",
-                         key=f"translate_{note['id']}"):
-                headers = {"Authorization":
-                           f"Bearer {st.session_state.token}"}
-                translation_res = requests.post(
+            note_key = f"note_{note['id']}"
+            translate_col, edit_col = st.columns(2)
+            if translate_col.button("Translate to English",
+                                    key=f"translate_{note_key}"):
+                translation_res = http.post(
                     f"{API_URL}/notes/translate",
                     json={"text": note["content"],
                           "source_lang": "ru", "target_lang": "en"},
@@ -121,34 +167,55 @@ if st.session_state.token:
                     else:
                         st.warning(f"Error: {translation_res.text}")
 
-            note_key = f"note_{note['id']}"
-
-            with st.expander("Edit this note", expanded=False):
-                new_title = st.text_input("Updated Title",
-                                          value=note["title"],
-                                          key=f"title_{note_key}")
-                new_content = st.text_area("Updated Content",
-                                           value=note["content"],
-                                           key=f"content_{note_key}")
-
-                if st.button("Update Note", key=f"update_{note_key}"):
-                    res = requests.put(
-                        f"{API_URL}/notes/{note['id']}",
-                        json={"title": new_title, "content": new_content},
-                        headers=headers
-                    )
-                    if res.ok:
-                        st.success("Note updated! Refresh to see changes.")
-                    else:
-                        st.error("Failed to update note.")
-
-                if st.button("Delete Note", key=f"delete_{note_key}"):
-                    res = requests.delete(f"{API_URL}/notes/{note['id']}",
-                                          headers=headers)
-                    if res.ok:
-                        st.success("Note deleted! "
-                                   "Refresh to remove from view.")
-                    else:
-                        st.error("Failed to delete note.")
+            if st.session_state.editing != note["id"]:
+                if edit_col.button("Edit", key=f"edit_{note_key}"):
+                    st.session_state.editing = note["id"]
+                    st.rerun()
+                continue
+
+            new_title = st.text_input("Updated Title",
+                                      value=note["title"],
+                                      key=f"title_{note_key}")
+            new_content = st.text_area("Updated Content",
+                                       value=note["content"],
+                                       key=f"content_{note_key}")
+            update_col, delete_col, cancel_col = st.columns(3)
+
+            if update_col.button("Update Note", key=f"update_{note_key}"):
+                res = http.put(
+                    f"{API_URL}/notes/{note['id']}",
+                    json={"title": new_title, "content": new_content},
+                    headers=headers
+                )
+                if res.ok:
+                    st.session_state.editing = None
+                    st.session_state.notes_version += 1
+                    st.rerun()
+                else:
+                    st.error("Failed to update note.")
+
+            if delete_col.button("Delete Note", key=f"delete_{note_key}"):
+                res = http.delete(f"{API_URL}/notes/{note['id']}",
+                                  headers=headers)
+                if res.ok:
+                    st.session_state.editing = None
+                    st.session_state.notes_version += 1
+                    st.rerun()
+                else:
+                    st.error("Failed to delete note.")
+
+            if cancel_col.button("Cancel", key=f"cancel_{note_key}"):
+                st.session_state.editing = None
+                st.rerun()
+
+        st.markdown("---")
+        prev_col, page_col, next_col = st.columns(3)
+        page_col.write(f"Page {len(cursors)}")
+        if prev_col.button("Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if next_col.button("Next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
     else:
         st.error("Failed to fetch notes.")
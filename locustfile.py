@@ -1,150 +1,221 @@
+"""Load-test user classes for the notes API.
+
+    locust -f locustfile.py --host http://localhost:8000 ReaderUser WriterUser
+
+Each scenario in benchmarks/loadtest.py is a set of these classes; that
+runner starts the app and the translation stub, runs locust headless and
+checks the results against benchmarks/slo.json.
+"""
 import random
-from locust import HttpUser, task, between
+import uuid
 
+from locust import HttpUser, between, constant, task
 
-class NotesAppUser(HttpUser):
-    wait_time = between(1, 3)
+PASSWORD = "password123"
+WORDS = ("заметка", "встреча", "купить", "молоко", "проект", "отчёт",
+         "перевод", "список", "идея", "звонок", "письмо", "завтра")
 
-    token = None
-    username = None
-    created_note_ids = []
 
-    def on_start(self):
-        self.username = f"testuser_{random.randint(1, 100000)}"
+def sentence(words=8):
+    return " ".join(random.choices(WORDS, k=words))
 
-        self.register()
 
+class NotesUser(HttpUser):
+    abstract = True
+    wait_time = between(0.5, 2)
+    prefix = "user"
+
+    def on_start(self):
+        self.username = f"{self.prefix}_{uuid.uuid4().hex[:12]}"
+        self.headers = {}
+        self.register()
         self.login()
 
     def register(self):
-        response = self.client.post(
-            "/users/register",
-            json={"username": self.username, "password": "password123"},
-            name="/users/register"
-        )
-
-        if response.status_code not in [200, 400]:
-            response.failure(
-                f"Registration failed with status code:{response.status_code}")
+        with self.client.post(
+                "/users/register",
+                json={"username": self.username, "password": PASSWORD},
+                name="/users/register", catch_response=True) as response:
+            if response.status_code not in (200, 400):
+                response.failure(
+                    f"Registration failed with status code: "
+                    f"{response.status_code}")
 
     def login(self):
+        with self.client.post(
+                "/users/login",
+                json={"username": self.username, "password": PASSWORD},
+                name="/users/login", catch_response=True) as response:
+            if response.status_code == 200:
+                token = response.json()["access_token"]
+                self.headers = {"Authorization": f"Bearer {token}"}
+            else:
+                response.failure(
+                    f"Login failed with status code: "
+                    f"{response.status_code}")
+
+    def seed_notes(self, count):
         response = self.client.post(
-            "/users/login",
-            json={"username": self.username, "password": "password123"},
-            name="/users/login"
-        )
+            "/notes/bulk", headers=self.headers, name="/notes/bulk",
+            json={"operations": [
+                {"op": "create", "title": sentence(3),
+                 "content": sentence(40)} for _ in range(count)]})
+        if response.status_code != 200:
+            return []
+        return [result["id"] for result in response.json()["results"]]
 
-        if response.status_code == 200:
-            self.token = response.json()["access_token"]
-        else:
-            response.failure(
-                f"Login failed with status code: {response.status_code}")
+
+class ReaderUser(NotesUser):
+    weight = 9
+    prefix = "reader"
+
+    def on_start(self):
+        super().on_start()
+        self.note_ids = self.seed_notes(50)
+        self.etags = {}
+        self.pages = {}
+        self.cursor = None
+        self.sync_cursor = 0
+
+    @task(5)
+    def list_notes(self):
+        params = {"limit": 20}
+        if self.cursor:
+            params["after"] = self.cursor
+        headers = dict(self.headers)
+        page = self.pages.get(self.cursor)
+        if page:
+            headers["If-None-Match"] = page[0]
+        response = self.client.get("/notes/", params=params,
+                                   headers=headers, name="/notes/ (GET)")
+        if response.status_code == 304:
+            # a 304 carries no cursor, reuse the one from the cached page
+            self.cursor = page[1]
+        elif response.status_code == 200:
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if "ETag" in response.headers:
+                self.pages[self.cursor] = (response.headers["ETag"],
+                                           next_cursor)
+            self.cursor = next_cursor
 
     @task(3)
-    def get_notes(self):
-        if not self.token:
+    def read_note(self):
+        if not self.note_ids:
             return
+        note_id = random.choice(self.note_ids)
+        headers = dict(self.headers)
+        if note_id in self.etags:
+            headers["If-None-Match"] = self.etags[note_id]
+        response = self.client.get(f"/notes/{note_id}", headers=headers,
+                                   name="/notes/{note_id} (GET)")
+        if "ETag" in response.headers:
+            self.etags[note_id] = response.headers["ETag"]
 
-        headers = {"Authorization": f"Bearer {self.token}"}
-        self.client.get(
-            "/notes/",
-            headers=headers,
-            name="/notes/ (GET)"
-        )
+    @task(1)
+    def search(self):
+        self.client.get("/notes/search", params={"q": random.choice(WORDS)},
+                        headers=self.headers, name="/notes/search")
 
-    @task(2)
-    def create_note(self):
-        if not self.token:
-            return
+    @task(1)
+    def sync(self):
+        response = self.client.get("/notes/changes",
+                                   params={"since": self.sync_cursor},
+                                   headers=self.headers,
+                                   name="/notes/changes")
+        if response.status_code == 200:
+            self.sync_cursor = response.json()["cursor"]
+        elif response.status_code == 410:
+            self.sync_cursor = 0
 
-        headers = {"Authorization": f"Bearer {self.token}"}
-        note_data = {
-            "title": f"Test Note {random.randint(1, 1000)}",
-            "content": f"This is a test note created at {self.username}"
-        }
 
-        response = self.client.post(
-            "/notes/",
-            json=note_data,
-            headers=headers,
-            name="/notes/ (POST)"
-        )
+class WriterUser(NotesUser):
+    weight = 1
+    prefix = "writer"
+
+    def on_start(self):
+        super().on_start()
+        self.created_note_ids = []
 
+    @task(3)
+    def create_note(self):
+        response = self.client.post(
+            "/notes/", headers=self.headers, name="/notes/ (POST)",
+            json={"title": sentence(3), "content": sentence(40)})
         if response.status_code == 200:
-            note_id = response.json()["id"]
-            self.created_note_ids.append(note_id)
+            self.created_note_ids.append(response.json()["id"])
 
-    @task(1)
+    @task(2)
     def update_note(self):
-        if not self.token or not self.created_note_ids:
+        if not self.created_note_ids:
             return
-
-        headers = {"Authorization": f"Bearer {self.token}"}
         note_id = random.choice(self.created_note_ids)
-        updated_data = {
-            "title": f"Updated Note {random.randint(1, 1000)}",
-            "content": f"This note was updated by {self.username}"
-        }
-
         self.client.put(
-            f"/notes/{note_id}",
-            json=updated_data,
-            headers=headers,
-            name="/notes/{note_id} (PUT)"
-        )
+            f"/notes/{note_id}", headers=self.headers,
+            name="/notes/{note_id} (PUT)",
+            json={"title": sentence(3), "content": sentence(40)})
 
     @task(1)
     def delete_note(self):
-        if not self.token or not self.created_note_ids:
+        if not self.created_note_ids:
             return
+        note_id = self.created_note_ids.pop(
+            random.randrange(len(self.created_note_ids)))
+        self.client.delete(f"/notes/{note_id}", headers=self.headers,
+                           name="/notes/{note_id} (DELETE)")
 
-        headers = {"Authorization": f"Bearer {self.token}"}
-        note_id = (
-            self.created_note_ids.pop()
-            if self.created_note_ids
-            else None
-        )
 
-        if note_id:
-            self.client.delete(
-                f"/notes/{note_id}",
-                headers=headers,
-                name="/notes/{note_id} (DELETE)"
-            )
+class BulkWriterUser(NotesUser):
+    weight = 1
+    prefix = "bulkwriter"
 
+    @task
+    def bulk_cycle(self):
+        note_ids = self.seed_notes(50)
+        if not note_ids:
+            return
+        operations = [{"op": "update", "id": note_id, "title": sentence(3),
+                       "content": sentence(40)}
+                      for note_id in note_ids[:25]]
+        operations += [{"op": "delete", "id": note_id}
+                       for note_id in note_ids[25:]]
+        self.client.post("/notes/bulk", headers=self.headers,
+                         name="/notes/bulk",
+                         json={"operations": operations})
 
-class NotesAppReadOnlyUser(HttpUser):
-    wait_time = between(1, 5)
 
-    token = None
-    username = None
+class TranslatorUser(NotesUser):
+    prefix = "translator"
 
     def on_start(self):
-        self.username = f"readonly_{random.randint(1, 100000)}"
+        super().on_start()
+        self.note_ids = self.seed_notes(10)
 
-        response = self.client.post(
-            "/users/register",
-            json={"username": self.username, "password": "password123"},
-            name="/users/register (readonly)"
-        )
+    @task(3)
+    def translate(self):
+        # a small vocabulary so repeated phrases hit the translation cache
+        self.client.post("/notes/translate", name="/notes/translate",
+                         json={"text": sentence(random.randint(1, 4)),
+                               "source_lang": "ru", "target_lang": "en"})
 
-        response = self.client.post(
-            "/users/login",
-            json={"username": self.username, "password": "password123"},
-            name="/users/login (readonly)"
-        )
+    @task(1)
+    def read_translation(self):
+        if not self.note_ids:
+            return
+        note_id = random.choice(self.note_ids)
+        self.client.get(f"/notes/{note_id}/translation",
+                        headers=self.headers,
+                        name="/notes/{note_id}/translation")
 
-        if response.status_code == 200:
-            self.token = response.json()["access_token"]
 
-    @task
-    def get_notes_repeatedly(self):
-        if not self.token:
-            return
+class LoginStormUser(NotesUser):
+    wait_time = constant(0)
+    prefix = "storm"
+
+    @task(9)
+    def login_again(self):
+        self.login()
 
-        headers = {"Authorization": f"Bearer {self.token}"}
-        self.client.get(
-            "/notes/",
-            headers=headers,
-            name="/notes/ (GET readonly)"
-        )
+    @task(1)
+    def register_new(self):
+        self.username = f"{self.prefix}_{uuid.uuid4().hex[:12]}"
+        self.register()
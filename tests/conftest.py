@@ -1,3 +1,4 @@
+import os
 from fastapi.testclient import TestClient
 import pytest
 import pytest_asyncio
@@ -6,15 +7,23 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 import httpx
 
-from app.main import app
-from app.db import Base
-from app.routers.users import get_db
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("DB_STATEMENT_HEADERS", "true")
+
+from app.main import app  # noqa: E402
+from app.db import Base, instrument_engine  # noqa: E402
+from app.routers.users import get_db  # noqa: E402
+from app.translation_cache import translation_cache  # noqa: E402
+from app.note_translations import note_translation_workers  # noqa: E402
+from app.note_sync import tombstone_compactor  # noqa: E402
 
 
 DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 engine = create_async_engine(DATABASE_URL,
                              connect_args={"check_same_thread": False})
+instrument_engine(engine)
 TestingSessionLocal = sessionmaker(bind=engine,
                                    class_=AsyncSession, expire_on_commit=False)
 
@@ -33,6 +42,9 @@ async def override_get_db():
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+translation_cache.session_factory = TestingSessionLocal
+note_translation_workers.session_factory = TestingSessionLocal
+tombstone_compactor.session_factory = TestingSessionLocal
 
 
 @pytest.fixture
@@ -50,6 +62,22 @@ async def async_client(test_db):
         yield ac
 
 
+async def login_headers(client, username, password="testpass"):
+    await client.post("/users/register",
+                      json={"username": username, "password": password})
+    response = await client.post("/users/login",
+                                 json={"username": username,
+                                       "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest_asyncio.fixture
+async def auth_client(async_client):
+    async_client.headers.update(
+        await login_headers(async_client, "noteowner"))
+    yield async_client
+
+
 @pytest.fixture
 def test_note_data():
     return {
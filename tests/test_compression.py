@@ -0,0 +1,150 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+
+from app.compression import CompressionMiddleware, GzipEncoder, negotiate
+from app.main import app
+from tests.conftest import login_headers
+
+PAYLOAD = b'{"title": "note", "content": "' + b"x" * 4000 + b'"}'
+
+inner = FastAPI()
+inner.add_middleware(CompressionMiddleware, minimum_size=500,
+                     encoders={"gzip": GzipEncoder})
+
+
+@inner.get("/big")
+async def big():
+    return Response(PAYLOAD, media_type="application/json")
+
+
+@inner.get("/small")
+async def small():
+    return Response(b'{"ok": true}', media_type="application/json")
+
+
+@inner.get("/stream")
+async def stream():
+    async def chunks():
+        for _ in range(3):
+            yield b'{"id": 1}\n' * 10
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+@inner.get("/events")
+async def events():
+    return Response(b"data: x\n\n" * 200, media_type="text/event-stream")
+
+
+@inner.get("/image")
+async def image():
+    return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+
+@inner.get("/not-modified")
+async def not_modified():
+    return Response(status_code=304, headers={"ETag": '"1"'})
+
+
+@pytest.fixture
+def raw_client():
+    transport = httpx.ASGITransport(app=inner)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_negotiate():
+    encoders = {"zstd": None, "br": None, "gzip": None}
+    assert negotiate("gzip, deflate", encoders) == "gzip"
+    assert negotiate("gzip, br, zstd", encoders) == "zstd"
+    assert negotiate("br;q=1.0, zstd;q=0.5", encoders) == "br"
+    assert negotiate("gzip;q=0", encoders) is None
+    assert negotiate("*", {"gzip": None}) == "gzip"
+    assert negotiate("identity", encoders) is None
+    assert negotiate("", encoders) is None
+
+
+@pytest.mark.asyncio
+async def test_large_response_is_gzipped(raw_client):
+    response = await raw_client.get("/big",
+                                    headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert int(response.headers["Content-Length"]) < len(PAYLOAD)
+    assert response.content == PAYLOAD
+
+
+@pytest.mark.asyncio
+async def test_passthrough_responses(raw_client):
+    headers = {"Accept-Encoding": "gzip"}
+    for path in ("/small", "/events", "/image", "/not-modified"):
+        response = await raw_client.get(path, headers=headers)
+        assert "Content-Encoding" not in response.headers, path
+    response = await raw_client.get("/big",
+                                    headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.content == PAYLOAD
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_is_compressed(raw_client):
+    async with raw_client.stream(
+            "GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in response.headers
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    assert gzip.decompress(raw) == b'{"id": 1}\n' * 30
+
+
+@pytest.mark.asyncio
+async def test_note_list_is_compressed(auth_client):
+    await auth_client.post("/notes/bulk", json={"operations": [
+        {"op": "create", "title": f"Long {i}", "content": "word " * 100}
+        for i in range(20)]})
+    response = await auth_client.get("/notes/", params={"limit": 20},
+                                     headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["X-DB-Statements"]
+    assert len(response.json()) == 20
+
+
+@pytest.mark.asyncio
+async def test_event_stream_headers_are_not_held(async_client):
+    headers = await login_headers(async_client, "ssecompression")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/notes/events",
+        "raw_path": b"/notes/events", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"test"), (b"accept-encoding", b"gzip"),
+                    (b"authorization",
+                     headers["Authorization"].encode())],
+        "client": ("127.0.0.1", 1234), "server": ("test", 80),
+    }
+    disconnected = asyncio.Event()
+    started = asyncio.Event()
+    messages = []
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.start":
+            started.set()
+
+    # through the whole middleware stack, before any event is published
+    task = asyncio.create_task(app(scope, receive, send))
+    try:
+        await asyncio.wait_for(started.wait(), 1)
+    finally:
+        disconnected.set()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    start = messages[0]
+    assert start["status"] == 200
+    assert b"content-encoding" not in dict(start["headers"])
@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy import text
+from app.db import make_engine
+
+
+@pytest.mark.asyncio
+async def test_make_engine_applies_sqlite_pragmas(tmp_path):
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'notes.db'}",
+                         echo=False)
+    async with engine.connect() as conn:
+        journal_mode = await conn.scalar(text("PRAGMA journal_mode"))
+        synchronous = await conn.scalar(text("PRAGMA synchronous"))
+        busy_timeout = await conn.scalar(text("PRAGMA busy_timeout"))
+    await engine.dispose()
+
+    assert journal_mode == "wal"
+    assert synchronous == 1
+    assert busy_timeout == 5000
+    assert engine.echo is False
+
+
+@pytest.mark.asyncio
+async def test_make_engine_in_memory_skips_pool_options():
+    engine = make_engine("sqlite+aiosqlite:///:memory:", pragmas={})
+    async with engine.connect() as conn:
+        assert await conn.scalar(text("SELECT 1")) == 1
+    await engine.dispose()
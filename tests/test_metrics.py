@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+
+from app import translation
+from app.metrics import Registry, statement_operation
+from benchmarks.translation_stub import start_stub
+
+
+def sample(text, line):
+    for row in text.splitlines():
+        if row.startswith(line + " "):
+            return float(row.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency",
+                                   ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+    registry.add_stats("cache", "Cache",
+                       lambda: {"hits": 3, "size": 2, "name": "x"},
+                       counters=("hits",))
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert sample(text, 'latency_seconds_sum{route="/a"}') == 5.55
+    assert "# TYPE cache_hits_total counter\ncache_hits_total 3.0" in text
+    assert "# TYPE cache_size gauge\ncache_size 2.0" in text
+    assert "cache_name" not in text
+
+
+def test_statement_operation():
+    assert statement_operation("SELECT notes.id FROM notes") == "SELECT"
+    assert statement_operation("\n  insert into notes") == "INSERT"
+    assert statement_operation("PRAGMA foreign_keys=ON") == "OTHER"
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(auth_client):
+    response = await auth_client.post("/notes/", json={
+        "title": "Метрики", "content": "счётчики"})
+    note_id = response.json()["id"]
+    before = (await auth_client.get("/metrics")).text
+    await auth_client.get(f"/notes/{note_id}")
+    await auth_client.get("/notes/999999")
+
+    response = await auth_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    ok = 'http_requests_total{method="GET",route="/notes/{note_id}",' \
+        'status="200"}'
+    missing = 'http_requests_total{method="GET",route="/notes/{note_id}",' \
+        'status="404"}'
+    assert sample(text, ok) == sample(before, ok) + 1
+    assert sample(text, missing) == sample(before, missing) + 1
+    selects = 'db_statement_duration_seconds_count{operation="SELECT"}'
+    assert sample(text, selects) > sample(before, selects)
+    assert "# TYPE password_hash_completed_total counter" in text
+    assert "# TYPE password_hash_in_flight gauge" in text
+    assert "note_events_" in text
+
+
+@pytest.mark.asyncio
+async def test_translation_upstream_metrics(auth_client):
+    runner, url = await start_stub()
+    calls = "translation_upstream_duration_seconds_count"
+    failures = 'translation_upstream_errors_total{reason="exception"}'
+    before = (await auth_client.get("/metrics")).text
+    try:
+        with patch.object(translation, "TRANSLATION_API_URL", url):
+            ok, _ = await translation._request_translations(
+                ["метрика"], "ru", "en")
+        assert ok
+    finally:
+        await runner.cleanup()
+    with patch.object(translation, "TRANSLATION_API_URL",
+                      "http://127.0.0.1:9/translate"):
+        ok, _ = await translation._request_translations(
+            ["метрика"], "ru", "en")
+    assert not ok
+
+    text = (await auth_client.get("/metrics")).text
+    assert sample(text, calls) == sample(before, calls) + 2
+    assert sample(text, failures) == sample(before, failures) + 1
@@ -0,0 +1,167 @@
+import asyncio
+from collections import OrderedDict
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.models.user import User
+from app.note_events import NoteEventBroker, note_event_broker
+from app.routers import notes as notes_router
+from app.routers.notes import note_events
+from app.schemas.user import UserOut
+from tests.conftest import TestingSessionLocal
+
+
+def event_id(frame: bytes) -> int:
+    return int(frame.split(b"\n", 1)[0].removeprefix(b"id: "))
+
+
+@pytest_asyncio.fixture
+async def owner(auth_client):
+    async with TestingSessionLocal() as db:
+        user = await db.scalar(select(User).where(
+            User.username == "noteowner"))
+    return UserOut(id=user.id, username=user.username)
+
+
+async def open_stream(owner, last_event_id=None):
+    async with TestingSessionLocal() as db:
+        response = await note_events(last_event_id=last_event_id, db=db,
+                                     current_user=owner)
+    return response.body_iterator
+
+
+async def next_frame(stream):
+    return await asyncio.wait_for(anext(stream), 1)
+
+
+def test_broker_replay():
+    broker = NoteEventBroker(buffer_size=3, queue_size=2)
+    broker.unsubscribe(broker.subscribe(1))
+    broker.publish(1, [(i, "created", {"id": i}) for i in (1, 2, 4, 5)])
+    broker.publish(1, [(3, "updated", {"id": 3})])
+
+    assert [event_id(f) for f in broker.replay(1, 2)] == [3, 4, 5]
+    assert broker.replay(1, 5) == []
+    assert broker.replay(1, 1) is None
+    assert broker.replay(2, 0) is None
+
+
+def test_broker_drops_slow_consumers():
+    broker = NoteEventBroker(queue_size=2)
+    slow = broker.subscribe(1)
+    fast = broker.subscribe(1)
+    broker.publish(1, [(1, "created", {"id": 1}), (2, "created", {"id": 2})])
+    fast.queue.get_nowait()
+    fast.queue.get_nowait()
+    broker.publish(1, [(3, "created", {"id": 3})])
+
+    assert slow.queue.get_nowait() is None
+    assert slow.queue.empty()
+    assert broker.subscribers[1] == {fast}
+    assert broker.stats() == {"subscribers": 1, "buffered_owners": 1,
+                              "published": 3, "dropped": 1}
+
+
+def test_broker_buffers_only_watched_owners():
+    broker = NoteEventBroker(retain=60, max_owners=2)
+    broker.publish(1, [(1, "created", {"id": 1})])
+    assert 1 not in broker.buffers
+    assert broker.replay(1, 0) is None
+
+    live = broker.subscribe(2)
+    for owner_id in (3, 4):
+        broker.unsubscribe(broker.subscribe(owner_id))
+    for owner_id in (2, 3, 4):
+        broker.publish(owner_id, [(1, "created", {"id": owner_id})])
+    # the cap evicts the least recently active owner without a subscriber
+    assert list(broker.buffers) == [2, 4]
+    assert broker.replay(3, 0) is None
+    assert len(broker.replay(4, 0)) == 1
+    assert live.queue.qsize() == 1
+
+
+def test_broker_evicts_disconnected_owners_after_retain():
+    broker = NoteEventBroker(retain=0)
+    broker.unsubscribe(broker.subscribe(1))
+    broker.publish(1, [(1, "created", {"id": 1})])
+    assert broker.buffers == {}
+    assert broker.disconnected == {}
+
+
+@pytest.mark.asyncio
+async def test_events_stream_writes(auth_client, owner):
+    stream = await open_stream(owner)
+    response = await auth_client.post("/notes/",
+                                      json={"title": "Live", "content": "a"})
+    note_id = response.json()["id"]
+    await auth_client.put(f"/notes/{note_id}",
+                          json={"title": "Live", "content": "b"})
+    await auth_client.delete(f"/notes/{note_id}")
+
+    frames = [await next_frame(stream) for _ in range(3)]
+    assert [f.split(b"\n")[1] for f in frames] == [
+        b"event: created", b"event: updated", b"event: deleted"]
+    assert b'"content":"b"' in frames[1]
+    ids = [event_id(f) for f in frames]
+    assert ids == sorted(ids) and len(set(ids)) == 3
+
+    await stream.aclose()
+    assert owner.id not in note_event_broker.subscribers
+
+
+@pytest.mark.asyncio
+async def test_events_bulk_ids_are_consecutive(auth_client, owner):
+    stream = await open_stream(owner)
+    await auth_client.post("/notes/bulk", json={"operations": [
+        {"op": "create", "title": "One", "content": "1"},
+        {"op": "create", "title": "Two", "content": "2"}]})
+    frames = [await next_frame(stream) for _ in range(2)]
+    await stream.aclose()
+
+    first, second = (event_id(f) for f in frames)
+    assert second == first + 1
+
+
+@pytest.mark.asyncio
+async def test_events_resume_from_last_event_id(auth_client, owner):
+    stream = await open_stream(owner)
+    for title in ("First", "Second"):
+        await auth_client.post("/notes/",
+                               json={"title": title, "content": "x"})
+    first = event_id(await next_frame(stream))
+    await stream.aclose()
+
+    resumed = await open_stream(owner, last_event_id=first)
+    frame = await next_frame(resumed)
+    await resumed.aclose()
+    assert event_id(frame) == first + 1
+    assert b'"title":"Second"' in frame
+
+    with patch.object(note_event_broker, "buffers", OrderedDict()):
+        reset = await open_stream(owner, last_event_id=first)
+        frame = await next_frame(reset)
+        await reset.aclose()
+    assert frame.split(b"\n")[1] == b"event: reset"
+    assert event_id(frame) == first + 1
+
+
+@pytest.mark.asyncio
+async def test_events_committed_while_opening_are_streamed(owner):
+    current_version = notes_router._current_version
+
+    async def version_then_write(db, owner_id):
+        version = await current_version(db, owner_id)
+        note_event_broker.publish(owner_id, [
+            (version + 1, "created", {"id": 0})])
+        return version
+
+    with patch.object(note_event_broker, "buffers", OrderedDict()), \
+            patch.object(notes_router, "_current_version",
+                         version_then_write):
+        stream = await open_stream(owner)
+        frame = await next_frame(stream)
+        await stream.aclose()
+    assert frame.split(b"\n")[1] == b"event: created"
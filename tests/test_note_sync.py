@@ -0,0 +1,204 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import Base
+from app.note_sync import TombstoneCompactor, record_tombstones
+from tests.conftest import TestingSessionLocal, login_headers
+
+
+async def changes(client, headers, **params):
+    response = await client.get("/notes/changes", params=params,
+                                headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_changes_since_cursor(async_client):
+    headers = await login_headers(async_client, "syncowner")
+    ids = []
+    for title in ("A", "B"):
+        response = await async_client.post(
+            "/notes/", json={"title": title, "content": "x"},
+            headers=headers)
+        ids.append(response.json()["id"])
+
+    full = await changes(async_client, headers)
+    assert [c["id"] for c in full["changes"]] == ids
+    assert not full["has_more"]
+    cursor = full["cursor"]
+    assert cursor == full["changes"][-1]["seq"]
+
+    await async_client.put(f"/notes/{ids[0]}",
+                           json={"title": "A2", "content": "y"},
+                           headers=headers)
+    await async_client.delete(f"/notes/{ids[1]}", headers=headers)
+    created = await async_client.post(
+        "/notes/", json={"title": "C", "content": "z"}, headers=headers)
+
+    delta = await changes(async_client, headers, since=cursor)
+    assert [(c["id"], c["deleted"], c["title"])
+            for c in delta["changes"]] == [
+        (ids[0], False, "A2"), (ids[1], True, None),
+        (created.json()["id"], False, "C")]
+    assert all(c["seq"] > cursor for c in delta["changes"])
+
+    settled = await changes(async_client, headers, since=delta["cursor"])
+    assert settled == {"changes": [], "cursor": delta["cursor"],
+                       "has_more": False}
+
+    page = await changes(async_client, headers, since=cursor, limit=2)
+    assert page["has_more"]
+    rest = await changes(async_client, headers, since=page["cursor"])
+    assert [c["id"] for c in page["changes"] + rest["changes"]] == [
+        c["id"] for c in delta["changes"]]
+
+
+@pytest.mark.asyncio
+async def test_bulk_changes_get_consecutive_seqs(async_client):
+    headers = await login_headers(async_client, "bulksyncowner")
+    start = (await changes(async_client, headers))["cursor"]
+    await async_client.post("/notes/bulk", headers=headers, json={
+        "operations": [{"op": "create", "title": "One", "content": "1"},
+                       {"op": "create", "title": "Two", "content": "2"}]})
+
+    delta = await changes(async_client, headers, since=start)
+    assert [c["seq"] for c in delta["changes"]] == [start + 1, start + 2]
+
+
+@pytest.mark.asyncio
+async def test_compacted_cursor_requires_resync(async_client):
+    headers = await login_headers(async_client, "compactowner")
+    response = await async_client.post(
+        "/notes/", json={"title": "Gone", "content": "x"}, headers=headers)
+    cursor = (await changes(async_client, headers))["cursor"]
+    await async_client.delete(f"/notes/{response.json()['id']}",
+                              headers=headers)
+    await async_client.post("/notes/", json={"title": "Kept", "content": "y"},
+                            headers=headers)
+
+    compactor = TombstoneCompactor(max_age=-1,
+                                   session_factory=TestingSessionLocal)
+    assert await compactor.run_once() >= 1
+
+    response = await async_client.get("/notes/changes",
+                                      params={"since": cursor},
+                                      headers=headers)
+    assert response.status_code == 410
+
+    full = await changes(async_client, headers)
+    assert [c["title"] for c in full["changes"]] == ["Kept"]
+    current = await changes(async_client, headers, since=full["cursor"])
+    assert current["changes"] == []
+
+
+@pytest.mark.asyncio
+async def test_deleted_id_is_not_reused_by_another_owner(async_client):
+    alice = await login_headers(async_client, "reuse_alice")
+    bob = await login_headers(async_client, "reuse_bob")
+    created = await async_client.post(
+        "/notes/", json={"title": "A", "content": "x"}, headers=alice)
+    note_id = created.json()["id"]
+    cursor = (await changes(async_client, alice))["cursor"]
+    await async_client.delete(f"/notes/{note_id}", headers=alice)
+
+    created = await async_client.post(
+        "/notes/", json={"title": "B", "content": "y"}, headers=bob)
+    assert created.json()["id"] != note_id
+    await async_client.delete(f"/notes/{created.json()['id']}",
+                              headers=bob)
+
+    delta = await changes(async_client, alice, since=cursor)
+    assert [(c["id"], c["deleted"]) for c in delta["changes"]] == [
+        (note_id, True)]
+
+
+@pytest.mark.asyncio
+async def test_tombstones_are_kept_per_owner(async_client):
+    alice = await login_headers(async_client, "tomb_alice")
+    bob = await login_headers(async_client, "tomb_bob")
+    cursors = {}
+    for name, headers in (("alice", alice), ("bob", bob)):
+        await async_client.post("/notes/", json={"title": name,
+                                                 "content": "x"},
+                                headers=headers)
+        cursors[name] = (await changes(async_client, headers))["cursor"]
+    async with TestingSessionLocal() as db:
+        result = await db.execute(text(
+            "SELECT username, id FROM users WHERE username IN "
+            "('tomb_alice', 'tomb_bob')"))
+        owners = dict(result.all())
+        # the same id deleted by two owners, as happens with reused ids
+        await record_tombstones(db, owners["tomb_alice"],
+                                [(424242, cursors["alice"] + 1)])
+        await record_tombstones(db, owners["tomb_bob"],
+                                [(424242, cursors["bob"] + 1)])
+        await db.commit()
+
+    for name, headers in (("alice", alice), ("bob", bob)):
+        delta = await changes(async_client, headers, since=cursors[name])
+        assert [c["id"] for c in delta["changes"]] == [424242]
+
+
+OLD_SCHEMA = (
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, "
+    "hashed_password VARCHAR)",
+    "CREATE TABLE notes (id INTEGER PRIMARY KEY, title VARCHAR, "
+    "content VARCHAR, owner_id INTEGER REFERENCES users (id))",
+    "CREATE TABLE note_versions (owner_id INTEGER PRIMARY KEY, "
+    "version INTEGER NOT NULL)",
+    "INSERT INTO users VALUES (1, 'a', 'x'), (2, 'b', 'x')",
+    "INSERT INTO notes VALUES (1, 'A1', 'x', 1), (2, 'B1', 'x', 2), "
+    "(3, 'A2', 'x', 1)",
+    "INSERT INTO note_versions VALUES (1, 7)",
+)
+
+
+@pytest.mark.asyncio
+async def test_upgrade_numbers_existing_notes():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            await conn.exec_driver_sql(statement)
+        await conn.run_sync(Base.metadata.create_all)
+        notes = (await conn.exec_driver_sql(
+            "SELECT id, owner_id, change_seq FROM notes "
+            "ORDER BY id")).all()
+        versions = (await conn.exec_driver_sql(
+            "SELECT owner_id, version, compacted_seq FROM note_versions "
+            "ORDER BY owner_id")).all()
+        indexes = {row[1] for row in (await conn.exec_driver_sql(
+            "PRAGMA index_list(notes)")).all()}
+    await engine.dispose()
+
+    assert [tuple(row) for row in notes] == [(1, 1, 1), (2, 2, 2),
+                                             (3, 1, 3)]
+    assert {"ix_notes_owner_id_id",
+            "ix_notes_owner_id_change_seq"} <= indexes
+    assert [tuple(row) for row in versions] == [(1, 7, 0), (2, 2, 0)]
+
+
+@pytest.mark.asyncio
+async def test_upgrade_rekeys_tombstones_per_owner():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "CREATE TABLE note_tombstones (note_id INTEGER PRIMARY KEY, "
+            "owner_id INTEGER NOT NULL, change_seq INTEGER NOT NULL, "
+            "deleted_at FLOAT NOT NULL)")
+        await conn.exec_driver_sql(
+            "CREATE INDEX ix_note_tombstones_deleted_at "
+            "ON note_tombstones (deleted_at)")
+        await conn.exec_driver_sql(
+            "INSERT INTO note_tombstones VALUES (1, 7, 3, 0.0)")
+        await conn.run_sync(Base.metadata.create_all)
+        key = [row[1] for row in (await conn.exec_driver_sql(
+            "PRAGMA table_info(note_tombstones)")).all() if row[5]]
+        rows = (await conn.exec_driver_sql(
+            "SELECT owner_id, note_id, change_seq FROM note_tombstones"
+        )).all()
+    await engine.dispose()
+
+    assert key == ["owner_id", "note_id"]
+    assert [tuple(row) for row in rows] == [(7, 1, 3)]
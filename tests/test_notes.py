@@ -1,42 +1,46 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
 import pytest
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from unittest.mock import patch
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import translation
+from app.auth import user_cache
 from app.db import Base
-
-TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
-
-engine = create_async_engine(TEST_DATABASE_URL, echo=True)
-TestingSessionLocal = sessionmaker(engine, class_=AsyncSession,
-                                   expire_on_commit=False)
-
-
-@pytest.fixture(scope="session")
-async def test_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    yield
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+from app.models.note import Note
+from app.models.translation import NoteTranslation
+from app.routers import notes as notes_router
+from app.note_translations import (
+    NOTE_TRANSLATION_RETRY_AFTER,
+    NoteTranslationWorkers,
+    note_translation_workers,
+)
+from benchmarks.translation_stub import start_stub
+from tests.conftest import TestingSessionLocal, login_headers
 
 
 @pytest.mark.asyncio
-async def test_create_note(async_client):
-    response = await async_client.post("/notes/",
-                                       json={"title": "Test",
-                                             "content": "Test content"})
+async def test_create_note(auth_client):
+    response = await auth_client.post("/notes/",
+                                      json={"title": "Test",
+                                            "content": "Test content"})
     assert response.status_code == 200
     assert response.json()["title"] == "Test"
     assert response.json()["content"] == "Test content"
 
 
 @pytest.mark.asyncio
-async def test_read_notes(async_client):
-    await async_client.post("/notes/",
-                            json={"title": "Note 1", "content": "Content 1"})
-    await async_client.post("/notes/",
-                            json={"title": "Note 2", "content": "Content 2"})
+async def test_read_notes(auth_client):
+    await auth_client.post("/notes/",
+                           json={"title": "Note 1", "content": "Content 1"})
+    await auth_client.post("/notes/",
+                           json={"title": "Note 2", "content": "Content 2"})
 
-    response = await async_client.get("/notes/")
+    response = await auth_client.get("/notes/")
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
@@ -44,55 +48,540 @@ async def test_read_notes(async_client):
 
 
 @pytest.mark.asyncio
-async def test_update_existing_note(async_client):
-    res = await async_client.post("/notes/",
-                                  json={"title": "Old", "content": "Content"})
+async def test_read_notes_keyset_pagination(auth_client):
+    for i in range(3):
+        await auth_client.post("/notes/",
+                               json={"title": f"Page {i}",
+                                     "content": "Paged"})
+
+    seen = []
+    after = None
+    while True:
+        params = {"limit": 2}
+        if after is not None:
+            params["after"] = after
+        response = await auth_client.get("/notes/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(note["id"] for note in page)
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen))
+    assert len(seen) >= 3
+
+
+@pytest.mark.asyncio
+async def test_read_notes_limit_validation(auth_client):
+    response = await auth_client.get("/notes/", params={"limit": 0})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_read_notes_stream(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Streamed",
+                                       "content": "Line"})
+    note_id = res.json()["id"]
+
+    response = await auth_client.get("/notes/",
+                                     params={"stream": True,
+                                             "after": note_id - 1})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(
+        "application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"id": note_id, "title": "Streamed",
+                        "content": "Line"}
+
+
+@pytest.mark.asyncio
+async def test_update_existing_note(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Old", "content": "Content"})
     note_id = res.json()["id"]
 
-    update = await async_client.put(f"/notes/{note_id}",
-                                    json={"title": "Updated",
-                                          "content": "New content"})
+    update = await auth_client.put(f"/notes/{note_id}",
+                                   json={"title": "Updated",
+                                         "content": "New content"})
     assert update.status_code == 200
     assert update.json()["title"] == "Updated"
 
 
 @pytest.mark.asyncio
-async def test_update_nonexistent_note(async_client):
-    response = await async_client.put("/notes/9999",
-                                      json={"title": "New",
-                                            "content": "Updated"})
+async def test_update_nonexistent_note(auth_client):
+    response = await auth_client.put("/notes/9999",
+                                     json={"title": "New",
+                                           "content": "Updated"})
     assert response.status_code == 404
     assert response.json()["detail"] == "Note not found"
 
 
 @pytest.mark.asyncio
-async def test_delete_existing_note(async_client):
-    res = await async_client.post("/notes/",
-                                  json={"title": "Temp",
-                                        "content": "To delete"})
+async def test_delete_existing_note(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Temp",
+                                       "content": "To delete"})
     note_id = res.json()["id"]
 
-    response = await async_client.delete(f"/notes/{note_id}")
+    response = await auth_client.delete(f"/notes/{note_id}")
     assert response.status_code == 200
     assert response.json()["detail"] == "Note deleted"
 
 
 @pytest.mark.asyncio
-async def test_delete_nonexistent_note(async_client):
-    response = await async_client.delete("/notes/9999")
+async def test_delete_nonexistent_note(auth_client):
+    response = await auth_client.delete("/notes/9999")
     assert response.status_code == 404
     assert response.json()["detail"] == "Note not found"
 
 
 @pytest.mark.asyncio
-async def test_delete_note_twice(async_client):
-    res = await async_client.post("/notes/",
-                                  json={"title": "Temp",
-                                        "content": "Temp"})
+async def test_delete_note_twice(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Temp",
+                                       "content": "Temp"})
     note_id = res.json()["id"]
 
-    del_1 = await async_client.delete(f"/notes/{note_id}")
+    del_1 = await auth_client.delete(f"/notes/{note_id}")
     assert del_1.status_code == 200
 
-    del_2 = await async_client.delete(f"/notes/{note_id}")
+    del_2 = await auth_client.delete(f"/notes/{note_id}")
     assert del_2.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_notes_require_token(async_client):
+    response = await async_client.get("/notes/")
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    response = await async_client.get(
+        "/notes/", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_notes_scoped_to_owner(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Mine",
+                                       "content": "Private"})
+    note_id = res.json()["id"]
+    other = await login_headers(auth_client, "otherowner")
+
+    listing = await auth_client.get("/notes/", headers=other)
+    assert note_id not in [note["id"] for note in listing.json()]
+
+    update = await auth_client.put(f"/notes/{note_id}",
+                                   json={"title": "Stolen",
+                                         "content": "Changed"},
+                                   headers=other)
+    assert update.status_code == 404
+
+    delete = await auth_client.delete(f"/notes/{note_id}", headers=other)
+    assert delete.status_code == 404
+
+    own = await auth_client.get("/notes/", params={"after": note_id - 1})
+    assert own.json()[0]["title"] == "Mine"
+
+
+@pytest.mark.asyncio
+async def test_search_notes_ranked_with_snippets(auth_client):
+    await auth_client.post("/notes/",
+                           json={"title": "Groceries",
+                                 "content": "buy zucchini and bread"})
+    await auth_client.post("/notes/",
+                           json={"title": "Zucchini recipes",
+                                 "content": "grilled zucchini, zucchini soup"})
+    await auth_client.post("/notes/",
+                           json={"title": "Unrelated",
+                                 "content": "nothing to see"})
+
+    response = await auth_client.get("/notes/search",
+                                     params={"q": "zucchini"})
+    assert response.status_code == 200
+    hits = response.json()
+    assert [hit["title"] for hit in hits] == ["Zucchini recipes",
+                                              "Groceries"]
+    assert "<mark>" in hits[0]["snippet"]
+    assert hits[0]["score"] <= hits[1]["score"]
+
+
+@pytest.mark.asyncio
+async def test_search_notes_pagination_and_sync(auth_client):
+    ids = []
+    for i in range(3):
+        res = await auth_client.post("/notes/",
+                                     json={"title": f"Quokka {i}",
+                                           "content": "quokka"})
+        ids.append(res.json()["id"])
+
+    first = await auth_client.get("/notes/search",
+                                  params={"q": "quokka", "limit": 2})
+    cursor = first.headers["X-Next-Cursor"]
+    second = await auth_client.get("/notes/search",
+                                   params={"q": "quokka", "limit": 2,
+                                           "after": cursor})
+    found = [hit["id"] for hit in first.json() + second.json()]
+    assert sorted(found) == ids
+    assert "X-Next-Cursor" not in second.headers
+
+    await auth_client.put(f"/notes/{ids[0]}",
+                          json={"title": "Renamed", "content": "gone"})
+    await auth_client.delete(f"/notes/{ids[1]}")
+    response = await auth_client.get("/notes/search", params={"q": "quokka"})
+    assert [hit["id"] for hit in response.json()] == [ids[2]]
+
+
+@pytest.mark.asyncio
+async def test_search_notes_scoped_and_safe(auth_client):
+    await auth_client.post("/notes/",
+                           json={"title": "Platypus", "content": "secret"})
+    other = await login_headers(auth_client, "otherowner")
+
+    response = await auth_client.get("/notes/search",
+                                     params={"q": "platypus"}, headers=other)
+    assert response.json() == []
+
+    response = await auth_client.get("/notes/search",
+                                     params={"q": 'platypus" OR *'})
+    assert response.status_code == 200
+
+    response = await auth_client.get("/notes/search",
+                                     params={"q": "platypus",
+                                             "after": "bogus"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_index_upgraded_with_owner():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "CREATE TABLE notes (id INTEGER PRIMARY KEY, title VARCHAR, "
+            "content VARCHAR, owner_id INTEGER)")
+        await conn.exec_driver_sql(
+            "INSERT INTO notes VALUES (1, 'Wombat', 'x', 1), "
+            "(2, 'Wombat', 'y', 2)")
+        await conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, "
+            "content='notes', content_rowid='id')")
+        await conn.run_sync(Base.metadata.create_all)
+        columns = {row[1] for row in (await conn.exec_driver_sql(
+            "PRAGMA table_info(notes_fts)")).all()}
+        hits = (await conn.exec_driver_sql(
+            "SELECT rowid FROM notes_fts WHERE notes_fts MATCH "
+            "'owner_id : \"2\" AND {title content} : wombat'")).all()
+    await engine.dispose()
+
+    assert "owner_id" in columns
+    assert [row[0] for row in hits] == [2]
+
+
+@pytest.mark.asyncio
+async def test_bulk_mixed_operations(auth_client):
+    first = await auth_client.post("/notes/",
+                                   json={"title": "Keep", "content": "v1"})
+    second = await auth_client.post("/notes/",
+                                    json={"title": "Drop", "content": "v1"})
+    keep_id, drop_id = first.json()["id"], second.json()["id"]
+
+    response = await auth_client.post("/notes/bulk", json={"operations": [
+        {"op": "create", "title": "Bulk A", "content": "a"},
+        {"op": "update", "id": keep_id, "title": "Kept", "content": "v2"},
+        {"op": "delete", "id": drop_id},
+        {"op": "create", "title": "Bulk B", "content": "b"},
+        {"op": "update", "id": drop_id, "title": "Late", "content": "x"},
+        {"op": "delete", "id": 999999},
+    ]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == [
+        "created", "updated", "deleted", "created", "not_found",
+        "not_found"]
+    assert [r["index"] for r in results] == list(range(6))
+    created_ids = [results[0]["id"], results[3]["id"]]
+    assert created_ids[0] < created_ids[1]
+
+    listing = await auth_client.get("/notes/", params={"after": keep_id - 1})
+    notes = {note["id"]: note for note in listing.json()}
+    assert notes[keep_id]["title"] == "Kept"
+    assert drop_id not in notes
+    assert notes[created_ids[0]]["title"] == "Bulk A"
+    assert notes[created_ids[1]]["title"] == "Bulk B"
+
+
+@pytest.mark.asyncio
+async def test_bulk_ignores_other_owners_notes(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Mine", "content": "x"})
+    note_id = res.json()["id"]
+    other = await login_headers(auth_client, "otherowner")
+
+    response = await auth_client.post("/notes/bulk", headers=other,
+                                      json={"operations": [
+                                          {"op": "delete", "id": note_id}]})
+    assert response.json()["results"][0]["status"] == "not_found"
+
+
+@pytest.mark.asyncio
+async def test_bulk_note_deleted_concurrently(auth_client):
+    created = await auth_client.post("/notes/bulk", json={"operations": [
+        {"op": "create", "title": "A", "content": "a"},
+        {"op": "create", "title": "B", "content": "b"}]})
+    first, second = (r["id"] for r in created.json()["results"])
+    before = await auth_client.get("/notes/changes")
+    real_bump = notes_router._bump_version
+
+    async def delete_then_bump(db, owner_id, count=1):
+        # another request deletes the note just before this one writes
+        async with TestingSessionLocal() as other:
+            await other.execute(delete(Note).where(Note.id == first))
+            await other.commit()
+        return await real_bump(db, owner_id, count)
+
+    with patch.object(notes_router, "_bump_version", delete_then_bump):
+        response = await auth_client.post("/notes/bulk", json={
+            "operations": [
+                {"op": "update", "id": first, "title": "A2",
+                 "content": "a2"},
+                {"op": "update", "id": second, "title": "B2",
+                 "content": "b2"}]})
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["results"]] == [
+        "not_found", "updated"]
+
+    after = await auth_client.get("/notes/changes",
+                                  params={"since": before.json()["cursor"]})
+    # only the applied operation consumed a sequence number
+    assert [(c["id"], c["seq"]) for c in after.json()["changes"]] == [
+        (second, before.json()["cursor"] + 1)]
+
+
+@pytest.mark.asyncio
+async def test_bulk_validation(auth_client):
+    response = await auth_client.post("/notes/bulk",
+                                      json={"operations": []})
+    assert response.status_code == 422
+
+    response = await auth_client.post("/notes/bulk", json={"operations": [
+        {"op": "rename", "id": 1}]})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_write_paths_statement_counts(auth_client):
+    user_cache.clear()
+    first = await auth_client.get("/notes/", params={"limit": 1})
+    # token user lookup, the version read and the page query
+    assert first.headers["X-DB-Statements"] == "3"
+    second = await auth_client.get("/notes/", params={"limit": 1})
+    assert second.headers["X-DB-Statements"] == "2"
+    cached = await auth_client.get(
+        "/notes/", params={"limit": 1},
+        headers={"If-None-Match": second.headers["ETag"]})
+    assert cached.headers["X-DB-Statements"] == "1"
+
+    created = await auth_client.post("/notes/",
+                                     json={"title": "Count",
+                                           "content": "me"})
+    # bumping the version, the write, queueing its translation
+    assert created.headers["X-DB-Statements"] == "3"
+    note_id = created.json()["id"]
+
+    updated = await auth_client.put(f"/notes/{note_id}",
+                                    json={"title": "Counted",
+                                          "content": "again"})
+    assert updated.json()["title"] == "Counted"
+    assert updated.headers["X-DB-Statements"] == "3"
+
+    deleted = await auth_client.delete(f"/notes/{note_id}")
+    assert deleted.status_code == 200
+    # plus recording the tombstone
+    assert deleted.headers["X-DB-Statements"] == "4"
+
+
+@pytest.mark.asyncio
+async def test_note_translation_materialized_in_background(auth_client):
+    runner, url = await start_stub()
+    await note_translation_workers.start()
+    try:
+        with patch.object(translation, "TRANSLATION_API_URL", url):
+            # earlier tests left pending rows behind; let them drain first
+            await note_translation_workers.queue.join()
+            res = await auth_client.post("/notes/",
+                                         json={"title": "Погода",
+                                               "content": "Идёт снег"})
+            note_id = res.json()["id"]
+            await note_translation_workers.queue.join()
+
+            ready = await auth_client.get(f"/notes/{note_id}/translation")
+            assert ready.status_code == 200
+            assert ready.json() == {"note_id": note_id, "target_lang": "en",
+                                    "status": "ready",
+                                    "translated_text": "[en] Идёт снег"}
+
+            await auth_client.put(f"/notes/{note_id}",
+                                  json={"title": "Погода",
+                                        "content": "Идёт дождь"})
+            await note_translation_workers.queue.join()
+            updated = await auth_client.get(f"/notes/{note_id}/translation")
+            assert updated.json()["translated_text"] == "[en] Идёт дождь"
+    finally:
+        await note_translation_workers.stop()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_note_translation_pending_and_scoped(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Список",
+                                       "content": "Молоко"})
+    note_id = res.json()["id"]
+
+    pending = await auth_client.get(f"/notes/{note_id}/translation")
+    assert pending.status_code == 202
+    assert pending.json()["status"] == "pending"
+
+    other_lang = await auth_client.get(f"/notes/{note_id}/translation",
+                                       params={"target_lang": "de"})
+    assert other_lang.status_code == 422
+
+    other = await login_headers(auth_client, "otherowner")
+    response = await auth_client.get(f"/notes/{note_id}/translation",
+                                     headers=other)
+    assert response.status_code == 404
+
+
+async def set_translation(note_id, **values):
+    async with TestingSessionLocal() as session:
+        await session.execute(update(NoteTranslation).where(
+            NoteTranslation.note_id == note_id).values(**values))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_failed_note_translation_backs_off(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Сбой", "content": "Ошибка"})
+    note_id = res.json()["id"]
+    await set_translation(note_id, status="failed", updated_at=time.time())
+
+    backing_off = await auth_client.get(f"/notes/{note_id}/translation")
+    assert backing_off.status_code == 202
+    assert backing_off.json()["status"] == "failed"
+    assert int(backing_off.headers["Retry-After"]) > 0
+
+    await set_translation(
+        note_id, updated_at=time.time() - NOTE_TRANSLATION_RETRY_AFTER - 1)
+    retried = await auth_client.get(f"/notes/{note_id}/translation")
+    assert retried.json()["status"] == "pending"
+    assert "Retry-After" not in retried.headers
+
+
+@pytest.mark.asyncio
+async def test_dropped_translation_jobs_are_requeued(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Очередь", "content": "Да"})
+    workers = NoteTranslationWorkers(queue_size=1,
+                                     session_factory=TestingSessionLocal)
+    workers.queue = asyncio.Queue(maxsize=1)
+    workers.enqueue([res.json()["id"], res.json()["id"] + 1000])
+    assert workers.dropped == 1
+    workers.queue.get_nowait()
+
+    await workers.requeue()
+    assert workers.queue.qsize() == 1
+    assert not workers._overflowed
+    await workers.requeue()
+    assert workers._overflowed
+
+
+@pytest.mark.asyncio
+async def test_sweep_retries_failed_translations(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Повтор", "content": "Да"})
+    note_id = res.json()["id"]
+    await set_translation(
+        note_id, status="failed",
+        updated_at=time.time() - NOTE_TRANSLATION_RETRY_AFTER - 1)
+    workers = NoteTranslationWorkers(session_factory=TestingSessionLocal,
+                                     sweep_interval=0.01)
+    workers.queue = asyncio.Queue(maxsize=100)
+
+    async def retried():
+        while (await workers.queue.get())[0] != note_id:
+            pass
+
+    sweep = asyncio.create_task(workers._sweep())
+    try:
+        await asyncio.wait_for(retried(), 1)
+    finally:
+        sweep.cancel()
+        await asyncio.gather(sweep, return_exceptions=True)
+
+
+def test_empty_translation_targets_fail_at_startup():
+    env = {**os.environ, "NOTE_TRANSLATION_TARGETS": " , "}
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.note_translations"],
+        env=env, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "NOTE_TRANSLATION_TARGETS" in result.stderr
+
+
+@pytest.mark.asyncio
+async def test_list_etag_revalidation(auth_client):
+    first = await auth_client.get("/notes/")
+    etag = first.headers["ETag"]
+
+    cached = await auth_client.get("/notes/",
+                                   headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+    other_page = await auth_client.get("/notes/", params={"limit": 5},
+                                       headers={"If-None-Match": etag})
+    assert other_page.status_code == 200
+
+    await auth_client.post("/notes/", json={"title": "New", "content": "x"})
+    changed = await auth_client.get("/notes/",
+                                    headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+    streamed = await auth_client.get("/notes/", params={"stream": True})
+    assert streamed.headers["ETag"] != changed.headers["ETag"]
+    assert streamed.text
+
+
+@pytest.mark.asyncio
+async def test_read_single_note_with_etag(auth_client):
+    res = await auth_client.post("/notes/",
+                                 json={"title": "Single", "content": "one"})
+    note_id = res.json()["id"]
+
+    response = await auth_client.get(f"/notes/{note_id}")
+    assert response.status_code == 200
+    assert response.json() == {"id": note_id, "title": "Single",
+                               "content": "one"}
+    etag = response.headers["ETag"]
+
+    cached = await auth_client.get(f"/notes/{note_id}",
+                                   headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    await auth_client.put(f"/notes/{note_id}",
+                          json={"title": "Single", "content": "two"})
+    fresh = await auth_client.get(f"/notes/{note_id}",
+                                  headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.json()["content"] == "two"
+
+    other = await login_headers(auth_client, "otherowner")
+    response = await auth_client.get(f"/notes/{note_id}", headers=other)
+    assert response.status_code == 404
@@ -1,3 +1,5 @@
+import json
+from collections import namedtuple
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -5,60 +7,100 @@ from app.routers.notes import (
     create_note, read_notes, update_note,
     delete_note, translate_note_text)
 from app.models.note import Note
+from app.models.user import User
 from app.schemas.note import NoteCreate, TranslationRequest
 from fastapi import HTTPException
 
+NoteRow = namedtuple("NoteRow", "id title content")
+
+
+def make_user(user_id=1):
+    return User(id=user_id, username="owner", hashed_password="hashed")
+
 
 @pytest.mark.asyncio
 async def test_create_note():
     mock_db = AsyncMock(spec=AsyncSession)
+    mock_db.execute.return_value = MagicMock()
+    mock_db.execute.return_value.scalar_one.return_value = 5
     note_data = NoteCreate(title="Test Note", content="Test Content")
 
-    result = await create_note(note=note_data, db=mock_db)
+    with patch("app.routers.notes.note_event_broker") as broker:
+        result = await create_note(note=note_data, db=mock_db,
+                                   current_user=make_user())
+
+    (owner_id, [(event_id, kind, _)]), _ = broker.publish.call_args
+    assert (owner_id, event_id, kind) == (1, 5, "created")
 
     mock_db.add.assert_called_once()
     mock_db.commit.assert_awaited_once()
-    mock_db.refresh.assert_awaited_once()
+    mock_db.refresh.assert_not_called()
     assert result.title == "Test Note"
     assert result.content == "Test Content"
-    assert result.owner_id == 1  # Default owner_id
+    assert result.owner_id == 1
 
 
 @pytest.mark.asyncio
 async def test_read_notes():
     mock_db = AsyncMock(spec=AsyncSession)
-    mock_note1 = Note(id=1, title="Note 1", content="Content 1", owner_id=1)
-    mock_note2 = Note(id=2, title="Note 2", content="Content 2", owner_id=1)
+    mock_db.scalar.return_value = 0
     mock_result = MagicMock()
-    mock_result.scalars.return_value.all.return_value = [
-        mock_note1, mock_note2]
+    mock_result.all.return_value = [
+        NoteRow(1, "Note 1", "Content 1"), NoteRow(2, "Note 2", "Content 2")]
     mock_db.execute.return_value = mock_result
 
-    result = await read_notes(db=mock_db)
+    response = await read_notes(db=mock_db, current_user=make_user())
 
     mock_db.execute.assert_called_once()
-    assert len(result) == 2
-    assert result[0].title == "Note 1"
-    assert result[1].title == "Note 2"
+    assert json.loads(response.body) == [
+        {"id": 1, "title": "Note 1", "content": "Content 1"},
+        {"id": 2, "title": "Note 2", "content": "Content 2"}]
+    assert response.media_type == "application/json"
+    assert "X-Next-Cursor" not in response.headers
+    assert response.headers["ETag"] == 'W/"0-100-0"'
+
+
+@pytest.mark.asyncio
+async def test_read_notes_next_cursor():
+    mock_db = AsyncMock(spec=AsyncSession)
+    mock_db.scalar.return_value = 0
+    mock_result = MagicMock()
+    mock_result.all.return_value = [NoteRow(i, f"Note {i}", "Content")
+                                    for i in range(1, 4)]
+    mock_db.execute.return_value = mock_result
+
+    response = await read_notes(limit=2, db=mock_db,
+                                current_user=make_user())
+
+    assert [note["id"] for note in json.loads(response.body)] == [1, 2]
+    assert response.headers["X-Next-Cursor"] == "2"
 
 
 @pytest.mark.asyncio
 async def test_update_note_success():
     mock_db = AsyncMock(spec=AsyncSession)
-    mock_note = MagicMock(spec=Note)
+    updated = Note(id=1, title="Updated Title", content="Updated Content",
+                   owner_id=1)
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = mock_note
+    mock_result.scalars.return_value.first.return_value = updated
+    mock_result.scalar_one.return_value = 3
     mock_db.execute.return_value = mock_result
 
     note_data = NoteCreate(title="Updated Title", content="Updated Content")
 
-    await update_note(note_id=1, updated_note=note_data, db=mock_db)
+    with patch("app.routers.notes.note_event_broker") as broker:
+        result = await update_note(note_id=1, updated_note=note_data,
+                                   db=mock_db, current_user=make_user())
 
-    mock_db.execute.assert_called_once()
-    assert mock_note.title == "Updated Title"
-    assert mock_note.content == "Updated Content"
+    broker.publish.assert_called_once_with(1, [(3, "updated", {
+        "id": 1, "title": "Updated Title", "content": "Updated Content"})])
+
+    statement = str(mock_db.execute.call_args_list[1].args[0])
+    assert statement.startswith("UPDATE notes")
+    assert "RETURNING" in statement
+    assert result is updated
     mock_db.commit.assert_awaited_once()
-    mock_db.refresh.assert_awaited_once()
+    mock_db.refresh.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -71,7 +113,8 @@ async def test_update_note_not_found():
     note_data = NoteCreate(title="Updated Title", content="Updated Content")
 
     with pytest.raises(HTTPException) as exc_info:
-        await update_note(note_id=999, updated_note=note_data, db=mock_db)
+        await update_note(note_id=999, updated_note=note_data,
+                          db=mock_db, current_user=make_user())
 
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "Note not found"
@@ -81,15 +124,21 @@ async def test_update_note_not_found():
 @pytest.mark.asyncio
 async def test_delete_note_success():
     mock_db = AsyncMock(spec=AsyncSession)
-    mock_note = MagicMock(spec=Note)
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = mock_note
+    mock_result.scalar_one_or_none.return_value = 1
+    mock_result.scalar_one.return_value = 4
     mock_db.execute.return_value = mock_result
 
-    result = await delete_note(note_id=1, db=mock_db)
+    with patch("app.routers.notes.note_event_broker") as broker:
+        result = await delete_note(note_id=1, db=mock_db,
+                                   current_user=make_user())
 
-    mock_db.execute.assert_called_once()
-    mock_db.delete.assert_awaited_once_with(mock_note)
+    broker.publish.assert_called_once_with(1, [(4, "deleted", {"id": 1})])
+
+    statement = str(mock_db.execute.call_args_list[1].args[0])
+    assert statement.startswith("DELETE FROM notes")
+    assert "RETURNING" in statement
+    mock_db.delete.assert_not_called()
     mock_db.commit.assert_awaited_once()
     assert result == {"detail": "Note deleted"}
 
@@ -98,11 +147,12 @@ async def test_delete_note_success():
 async def test_delete_note_not_found():
     mock_db = AsyncMock(spec=AsyncSession)
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = None
+    mock_result.scalar_one_or_none.return_value = None
     mock_db.execute.return_value = mock_result
 
     with pytest.raises(HTTPException) as exc_info:
-        await delete_note(note_id=999, db=mock_db)
+        await delete_note(note_id=999, db=mock_db,
+                          current_user=make_user())
 
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "Note not found"
@@ -130,3 +180,16 @@ async def test_translate_note_text():
     )
     assert result.original_text == "Привет мир"
     assert result.translated_text == "Hello world"
+
+
+@pytest.mark.asyncio
+async def test_read_notes_not_modified_skips_query():
+    mock_db = AsyncMock(spec=AsyncSession)
+    mock_db.scalar.return_value = 7
+
+    result = await read_notes(if_none_match='W/"7-100-0"', db=mock_db,
+                              current_user=make_user())
+
+    assert result.status_code == 304
+    assert result.headers["ETag"] == 'W/"7-100-0"'
+    mock_db.execute.assert_not_called()
@@ -0,0 +1,60 @@
+import json
+import pytest
+from sqlalchemy import select
+from app.models.user import User
+from app.provision import provision, read_users
+from tests.conftest import TestingSessionLocal
+
+
+def fake_hash(password):
+    return f"hashed:{password}"
+
+
+@pytest.mark.asyncio
+async def test_provision_reports_duplicates_without_aborting(tmp_path):
+    async with TestingSessionLocal() as db:
+        db.add(User(username="prov_taken", hashed_password="x"))
+        await db.commit()
+
+    path = tmp_path / "users.csv"
+    path.write_text("username,password\n"
+                    "prov_alice,pw1\n"
+                    "prov_taken,pw2\n"
+                    "prov_bob,pw3\n"
+                    "prov_alice,pw4\n"
+                    ",pw5\n"
+                    "prov_carol,pw6\n")
+
+    report = await provision(read_users(str(path)),
+                             session_factory=TestingSessionLocal,
+                             batch_size=2, workers=2, hash_func=fake_hash)
+
+    assert report.created == 3
+    assert report.existing == ["prov_taken"]
+    assert report.repeated == ["prov_alice"]
+    assert report.invalid == [6]
+
+    async with TestingSessionLocal() as db:
+        result = await db.execute(
+            select(User.username, User.hashed_password)
+            .where(User.username.in_(["prov_alice", "prov_bob",
+                                      "prov_carol"]))
+            .order_by(User.username))
+        assert result.all() == [("prov_alice", "hashed:pw1"),
+                                ("prov_bob", "hashed:pw3"),
+                                ("prov_carol", "hashed:pw6")]
+
+
+def test_read_users_ndjson(tmp_path):
+    path = tmp_path / "users.ndjson"
+    path.write_text(json.dumps({"username": "a", "password": "1"}) + "\n"
+                    "\n"
+                    "not json\n"
+                    "[]\n"
+                    "\"a\"\n"
+                    "1\n"
+                    + json.dumps({"username": "b", "password": "2"}) + "\n")
+
+    assert list(read_users(str(path))) == [
+        (1, "a", "1"), (3, None, None), (4, None, None), (5, None, None),
+        (6, None, None), (7, "b", "2")]
@@ -0,0 +1,89 @@
+import logging
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app import db
+from app.db import count_statements, full_scans
+from app.main import app
+from app.models.note import Note
+from app.routers.debug import read_query_profile
+from tests.conftest import TestingSessionLocal
+
+
+def test_full_scans():
+    assert full_scans(["SCAN notes"]) == ["notes"]
+    assert full_scans(["SCAN TABLE users"]) == ["users"]
+    assert full_scans(["SEARCH notes USING INTEGER PRIMARY KEY (rowid=?)",
+                       "SCAN notes_fts VIRTUAL TABLE INDEX 0:M3"]) == []
+
+
+@pytest.mark.asyncio
+async def test_slow_select_is_explained(caplog):
+    with patch.object(db, "DB_SLOW_QUERY_MS", 0), \
+            caplog.at_level(logging.WARNING, logger="app.db"), \
+            count_statements() as counter:
+        async with TestingSessionLocal() as session:
+            await session.execute(
+                select(Note.id).where(Note.content == "нет такой"))
+            await session.execute(select(Note.id).where(Note.id == 1))
+
+    scan, lookup = counter.statements
+    assert scan["slow"] and scan["full_scans"] == ["notes"]
+    assert any(detail.startswith("SCAN notes") for detail in scan["plan"])
+    assert lookup["plan"] and lookup["full_scans"] == []
+    assert counter.total_ms > 0
+    assert "full scan of notes" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_fast_statements_are_not_logged(caplog):
+    with caplog.at_level(logging.WARNING, logger="app.db"), \
+            count_statements() as counter:
+        async with TestingSessionLocal() as session:
+            await session.execute(select(Note.id).where(Note.id == 1))
+
+    assert "slow" not in counter.statements[0]
+    assert counter.statements[0]["duration_ms"] is not None
+    assert "Slow" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_query_profile_endpoint(auth_client):
+    response = await auth_client.post("/notes/", json={
+        "title": "Профиль", "content": "запросы"})
+    note_id = response.json()["id"]
+
+    with patch("app.main.DB_PROFILE", True):
+        response = await auth_client.get(f"/notes/{note_id}")
+    assert float(response.headers["X-DB-Time"]) >= 0
+    data = await read_query_profile(response.headers["X-DB-Profile"])
+    assert data["path"] == f"/notes/{note_id}"
+    assert data["status"] == 200
+    assert data["statements"] == int(response.headers["X-DB-Statements"])
+    assert len(data["queries"]) == data["statements"]
+    assert all(query["statement"] for query in data["queries"])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await read_query_profile("unknown")
+    assert exc_info.value.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_debug_router_not_mounted_without_profiling(auth_client):
+    assert not any(getattr(route, "path", "").startswith("/debug")
+                   for route in app.routes)
+    response = await auth_client.get("/debug/queries/unknown")
+    assert response.status_code == 404
+    assert "X-DB-Profile" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_statement_headers_are_off_by_default(auth_client):
+    with patch("app.main.DB_STATEMENT_HEADERS", False):
+        response = await auth_client.get("/notes/")
+    assert response.status_code == 200
+    assert "X-DB-Statements" not in response.headers
+    assert "X-DB-Time" not in response.headers
@@ -0,0 +1,46 @@
+import pytest
+
+from app.db import make_engine
+from benchmarks.seed import seed
+
+
+async def counts(engine):
+    async with engine.connect() as conn:
+        return [
+            (await conn.exec_driver_sql(sql)).scalar()
+            for sql in ("SELECT count(*) FROM users",
+                        "SELECT count(*) FROM notes",
+                        "SELECT coalesce(sum(version), 0) FROM note_versions",
+                        "SELECT count(*) FROM notes_fts "
+                        "WHERE notes_fts MATCH 'молоко OR note OR план'")]
+
+
+@pytest.mark.asyncio
+async def test_seed_row_counts(tmp_path):
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'seed.db'}",
+                         echo=False)
+    try:
+        owner_ids = await seed(engine, users=5, notes=50, batch_size=7,
+                               mean_size=50, max_size=200)
+        users, notes, versions, matches = await counts(engine)
+    finally:
+        await engine.dispose()
+
+    assert len(owner_ids) == users == 5
+    assert notes == versions == 50
+    assert matches > 0
+
+
+@pytest.mark.asyncio
+async def test_seed_empty(tmp_path):
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}",
+                         echo=False)
+    try:
+        assert await seed(engine, users=0, notes=0) == []
+        assert await counts(engine) == [0, 0, 0, 0]
+        with pytest.raises(ValueError):
+            await seed(engine, users=0, notes=10)
+        with pytest.raises(ValueError):
+            await seed(engine, users=1, notes=1, mean_size=0)
+    finally:
+        await engine.dispose()
@@ -1,6 +1,13 @@
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock
-from app.translation import translate_text
+from sqlalchemy import select
+from app.models.translation import TranslationCacheEntry
+from app import translation
+from app.translation import TranslationBatcher, translate_text
+from app.translation_cache import TranslationCache
+from benchmarks.translation_stub import STUB_STATS, start_stub
+from tests.conftest import TestingSessionLocal
 
 
 class MockResponse:
@@ -71,3 +78,153 @@ async def test_translate_text_exception():
     with patch('aiohttp.ClientSession', return_value=session_mock):
         result = await translate_text("Test text", "ru", "en")
         assert result == "Translation failed: Connection error"
+
+
+def ok_session(translated):
+    mock_response = MockResponse(status=200, json_data={
+        "data": {"translations": {"translatedText": [translated]}}})
+    session_mock = MagicMock()
+    session_mock.__aenter__.return_value = session_mock
+    session_mock.__aexit__.return_value = None
+    session_mock.post.return_value.__aenter__.return_value = mock_response
+    return session_mock
+
+
+@pytest.mark.asyncio
+async def test_translate_text_served_from_cache():
+    session_mock = ok_session("Good morning")
+
+    with patch('aiohttp.ClientSession', return_value=session_mock):
+        first = await translate_text("Доброе утро", "ru", "en")
+        second = await translate_text("Доброе утро", "ru", "en")
+
+    assert first == second == "Good morning"
+    session_mock.post.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_translate_text_errors_not_cached():
+    error_session = MagicMock()
+    error_session.__aenter__.return_value = error_session
+    error_session.__aexit__.return_value = None
+    error_session.post.return_value.__aenter__.return_value = MockResponse(
+        status=429, text_data="quota")
+
+    with patch('aiohttp.ClientSession', return_value=error_session):
+        result = await translate_text("Спокойной ночи", "ru", "en")
+    assert result == "Translation error: 429"
+
+    with patch('aiohttp.ClientSession',
+               return_value=ok_session("Good night")):
+        result = await translate_text("Спокойной ночи", "ru", "en")
+    assert result == "Good night"
+
+
+@pytest.mark.asyncio
+async def test_translation_cache_tiers():
+    cache = TranslationCache(maxsize=2, ttl=60,
+                             session_factory=TestingSessionLocal)
+    await cache.set("один", "ru", "en", "one")
+    await cache.set("два", "ru", "en", "two")
+    await cache.set("три", "ru", "en", "three")
+
+    assert await cache.get("три", "ru", "en") == "three"
+    assert cache.stats()["memory_size"] == 2
+    assert await cache.get("один", "ru", "en") == "one"
+    assert await cache.get("один", "ru", "de") is None
+    assert cache.stats() == {"memory_hits": 1, "persistent_hits": 1,
+                             "misses": 1, "memory_size": 2}
+
+
+@pytest.mark.asyncio
+async def test_translation_cache_ttl_and_size_eviction():
+    cache = TranslationCache(maxsize=10, ttl=60, max_rows=2,
+                             session_factory=TestingSessionLocal)
+    with patch("app.translation_cache.time.time", return_value=1000.0):
+        await cache.set("старое", "ru", "en", "old")
+    cache.clear()
+    assert await cache.get("старое", "ru", "en") is None
+
+    with patch("app.translation_cache.PRUNE_EVERY", 1):
+        for word in ("а", "б", "в"):
+            await cache.set(word, "ru", "fr", word.upper())
+    cache.clear()
+
+    async with TestingSessionLocal() as session:
+        keys = (await session.execute(
+            select(TranslationCacheEntry.key))).scalars().all()
+    assert TranslationCache.make_key("старое", "ru", "en") not in keys
+    assert TranslationCache.make_key("а", "ru", "fr") not in keys
+    assert TranslationCache.make_key("в", "ru", "fr") in keys
+
+
+@pytest.mark.asyncio
+async def test_translate_text_uses_shared_session():
+    runner, url = await start_stub()
+    await translation.start_http_session()
+    shared = translation._http_session
+    try:
+        with patch.object(translation, "TRANSLATION_API_URL", url), \
+                patch("aiohttp.ClientSession",
+                      side_effect=AssertionError("per-call session")):
+            first = await translate_text("Первый", "ru", "en")
+            second = await translate_text("Второй", "ru", "en")
+        assert first == "[en] Первый"
+        assert second == "[en] Второй"
+        assert translation._http_session is shared
+    finally:
+        await translation.close_http_session()
+        await runner.cleanup()
+    assert translation._http_session is None
+
+
+@pytest.mark.asyncio
+async def test_batcher_collapses_concurrent_requests():
+    runner, url = await start_stub()
+    batcher = TranslationBatcher(window=0.05, max_size=100)
+    texts = ["кот", "пёс", "кот", "мышь", "пёс", "кот"]
+    try:
+        with patch.object(translation, "TRANSLATION_API_URL", url):
+            results = await asyncio.gather(
+                *(batcher.translate(text, "ru", "en") for text in texts))
+    finally:
+        await runner.cleanup()
+
+    assert results == [(True, f"[en] {text}") for text in texts]
+    assert batcher.upstream_calls == 1
+    assert batcher.sent_texts == 3
+    assert runner.app[STUB_STATS] == {"requests": 1, "texts": 3}
+
+
+@pytest.mark.asyncio
+async def test_batcher_splits_on_size_and_language_pair():
+    runner, url = await start_stub()
+    batcher = TranslationBatcher(window=0.05, max_size=2)
+    requests = [("раз", "en"), ("два", "en"), ("три", "en"), ("раз", "de")]
+    try:
+        with patch.object(translation, "TRANSLATION_API_URL", url):
+            results = await asyncio.gather(
+                *(batcher.translate(text, "ru", target)
+                  for text, target in requests))
+    finally:
+        await runner.cleanup()
+
+    assert [text for _, text in results] == [
+        "[en] раз", "[en] два", "[en] три", "[de] раз"]
+    assert batcher.upstream_calls == 3
+
+
+@pytest.mark.asyncio
+async def test_batcher_fans_out_errors():
+    session_mock = MagicMock()
+    session_mock.__aenter__.return_value = session_mock
+    session_mock.__aexit__.return_value = None
+    session_mock.post.side_effect = Exception("Connection error")
+    batcher = TranslationBatcher(window=0.01)
+
+    with patch('aiohttp.ClientSession', return_value=session_mock):
+        results = await asyncio.gather(batcher.translate("x", "ru", "en"),
+                                       batcher.translate("y", "ru", "en"))
+
+    assert results == [(False, "Translation failed: Connection error")] * 2
+    session_mock.post.assert_called_once()
@@ -1,5 +1,6 @@
 import pytest
 import re
+from app.auth import password_hasher
 
 
 @pytest.mark.asyncio
@@ -73,3 +74,32 @@ async def test_login_token_format(async_client):
 async def test_db_dependency(async_client):
     response = await async_client.get("/users/register")
     assert response.status_code == 405
+
+
+@pytest.mark.asyncio
+async def test_register_statements(async_client):
+    response = await async_client.post("/users/register",
+                                       json={"username": "onestatement",
+                                             "password": "testpass"})
+    assert response.status_code == 200
+    assert response.headers["X-DB-Statements"] == "2"
+
+    completed = password_hasher.completed
+    duplicate = await async_client.post("/users/register",
+                                        json={"username": "onestatement",
+                                              "password": "testpass"})
+    assert duplicate.status_code == 400
+    assert duplicate.headers["X-DB-Statements"] == "1"
+    assert password_hasher.completed == completed
+
+
+@pytest.mark.asyncio
+async def test_hashing_stats_in_metrics(async_client):
+    await async_client.post("/users/register",
+                            json={"username": "statsuser",
+                                  "password": "testpass"})
+    assert (await async_client.get("/users/hashing/stats")).status_code \
+        == 404
+    metrics = (await async_client.get("/metrics")).text
+    assert "password_hash_completed" in metrics
+    assert "password_hash_queue_depth 0.0" in metrics
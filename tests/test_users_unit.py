@@ -1,8 +1,23 @@
+import asyncio
+import threading
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import JWTError, jwt
+from app.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    PasswordHasher,
+    create_access_token,
+    decode_access_token,
+    get_current_user,
+    token_cache,
+    user_cache,
+)
+from app.schemas.user import UserOut
 from app.routers.users import register, login
-from app.models.user import User
 from app.schemas.user import UserCreate
 from fastapi import HTTPException
 
@@ -10,10 +25,7 @@ from fastapi import HTTPException
 @pytest.mark.asyncio
 async def test_register_success():
     mock_db = AsyncMock(spec=AsyncSession)
-
-    mock_result = MagicMock()
-    mock_result.scalar_one_or_none.return_value = None
-    mock_db.execute.return_value = mock_result
+    mock_db.scalar.return_value = None
 
     user_data = UserCreate(username="testuser", password="password123")
 
@@ -21,31 +33,48 @@ async def test_register_success():
                return_value="hashed_password"):
         result = await register(user=user_data, db=mock_db)
 
+    mock_db.scalar.assert_awaited_once()
+    mock_db.execute.assert_not_called()
     mock_db.add.assert_called_once()
     mock_db.commit.assert_awaited_once()
-    mock_db.refresh.assert_awaited_once()
+    mock_db.refresh.assert_not_called()
     assert result == {"message": "User registered successfully"}
 
 
 @pytest.mark.asyncio
 async def test_register_username_taken():
     mock_db = AsyncMock(spec=AsyncSession)
-    mock_existing_user = User(
-        username="testuser", hashed_password="hashed_password"
-    )
-    mock_result = MagicMock()
-    mock_result.scalar_one_or_none.return_value = mock_existing_user
-    mock_db.execute.return_value = mock_result
+    mock_db.scalar.return_value = 1
 
     user_data = UserCreate(username="testuser", password="password123")
 
-    with pytest.raises(HTTPException) as exc_info:
-        await register(user=user_data, db=mock_db)
+    with patch("app.routers.users.get_password_hash") as mock_hash:
+        with pytest.raises(HTTPException) as exc_info:
+            await register(user=user_data, db=mock_db)
 
     assert exc_info.value.status_code == 400
     assert exc_info.value.detail == "Username already registered"
+    mock_hash.assert_not_called()
     mock_db.add.assert_not_called()
-    mock_db.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_register_username_taken_concurrently():
+    mock_db = AsyncMock(spec=AsyncSession)
+    mock_db.scalar.return_value = None
+    mock_db.commit.side_effect = IntegrityError(
+        "INSERT INTO users", {}, Exception("UNIQUE constraint failed"))
+
+    user_data = UserCreate(username="testuser", password="password123")
+
+    with patch("app.routers.users.get_password_hash",
+               return_value="hashed_password"):
+        with pytest.raises(HTTPException) as exc_info:
+            await register(user=user_data, db=mock_db)
+
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Username already registered"
+    mock_db.rollback.assert_awaited_once()
 
 
 @pytest.mark.asyncio
@@ -107,3 +136,114 @@ async def test_login_incorrect_password():
     mock_verify.assert_called_once_with("wrong_password", "hashed_password")
     assert exc_info.value.status_code == 400
     assert exc_info.value.detail == "Invalid credentials"
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_runs_off_event_loop():
+    hasher = PasswordHasher(workers=1, queue_limit=1)
+    release = threading.Event()
+
+    hashing = asyncio.create_task(hasher.run(release.wait, 5))
+    await asyncio.sleep(0.01)
+    # the event loop keeps serving other work while the hash runs
+    assert not hashing.done()
+    assert hasher.stats()["in_flight"] == 1
+    release.set()
+
+    assert await hashing is True
+    stats = hasher.stats()
+    assert stats["completed"] == 1
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_sheds_load_when_queue_full():
+    hasher = PasswordHasher(workers=1, queue_limit=1)
+    release = threading.Event()
+
+    running = asyncio.create_task(hasher.run(release.wait, 5))
+    queued = asyncio.create_task(hasher.run(release.wait, 5))
+    await asyncio.sleep(0.01)
+    assert hasher.stats()["queue_depth"] == 1
+
+    with pytest.raises(HTTPException) as exc_info:
+        await hasher.run(release.wait, 5)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert hasher.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_caches_token_and_user():
+    token_cache.clear()
+    user_cache.clear()
+    token = create_access_token({"sub": "cacheduser"})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer",
+                                               credentials=token)
+    mock_db = AsyncMock(spec=AsyncSession)
+    mock_result = MagicMock()
+    mock_result.first.return_value = MagicMock(id=7, username="cacheduser")
+    mock_db.execute.return_value = mock_result
+
+    with patch("app.auth.jwt.decode", wraps=jwt.decode) as mock_decode:
+        first = await get_current_user(credentials=credentials, db=mock_db)
+        second = await get_current_user(credentials=credentials, db=mock_db)
+
+    assert first == second == UserOut(id=7, username="cacheduser")
+    mock_decode.assert_called_once()
+    mock_db.execute.assert_awaited_once()
+    assert token_cache.stats()["hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_expired_token_evicted_from_cache():
+    token_cache.clear()
+    token = create_access_token({"sub": "expiring"})
+    claims = decode_access_token(token)
+
+    with patch("app.auth.time.time", return_value=claims["exp"] + 1):
+        assert token_cache.get(token) is None
+
+    expired = jwt.encode({"sub": "expiring", "exp": 1}, SECRET_KEY,
+                         algorithm=ALGORITHM)
+    with pytest.raises(JWTError):
+        decode_access_token(expired)
+    assert token_cache.get(expired) is None
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_holds_slot_until_thread_finishes():
+    hasher = PasswordHasher(workers=1, queue_limit=0)
+    release = threading.Event()
+
+    abandoned = asyncio.create_task(hasher.run(release.wait, 5))
+    await asyncio.sleep(0.01)
+    abandoned.cancel()
+    await asyncio.sleep(0.01)
+    # the client went away but the thread is still busy hashing
+    assert hasher.stats()["in_flight"] == 1
+    with pytest.raises(HTTPException):
+        await hasher.run(release.wait, 5)
+
+    release.set()
+    for _ in range(100):
+        if not hasher.in_flight:
+            break
+        await asyncio.sleep(0.01)
+    assert hasher.stats()["in_flight"] == 0
+    assert hasher.stats()["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_counts_failures():
+    hasher = PasswordHasher(workers=1, queue_limit=1)
+
+    with pytest.raises(ValueError):
+        await hasher.run(int, "not a number")
+    stats = hasher.stats()
+    assert stats["failed"] == 1
+    assert stats["completed"] == 0
+    assert stats["in_flight"] == 0